@@ -9,6 +9,8 @@
 
 # Christian Tschudin, K6CFT, 2025
 
+import nckjit
+import ncktables
 import numpy as np
 
 # FT8 bit message en/decoding (CRC and LDPC)
@@ -392,33 +394,12 @@ class FT8_CODING:
     # parity bit, to be xor'd with the 91 data bits.
     # thus gen[83][91].
     # as in encode174_91.f90
-    gen = []
 
     def __init__(self):
-        # turn rawg into gen.
+        # gen_sys is computed by _gen_sys(), and cached on disk
         assert len(self.rawg) == 83
-
-        if len(self.gen) == 0:
-            hex2 = { hex(i)[2]:i for i in range(16) }
-            for e in self.rawg:
-                row = np.zeros(91, dtype=np.int32)
-                for i,c in enumerate(e):
-                    x = hex2[c]
-                    for j in range(0, 4):
-                        ind = i*4 + (3-j)
-                        if ind >= 0 and ind < 91:
-                            if (x & (1 << j)) != 0:
-                                row[ind] = 1
-                            else:
-                                row[ind] = 0
-                self.gen.append(row)
-
-        # turn gen[] into a systematic array by prepending
-        # a 91x91 identity matrix.
-        self.gen_sys = np.zeros((174, 91), dtype=np.int32)
-        self.gen_sys[91:,:] = self.gen
-        self.gen_sys[0:91,:] = np.eye(91, dtype=np.int32)
-
+        self.gen_sys = ncktables.load('ft8_gen', None, _gen_sys)['gen_sys']
+        self.gen = self.gen_sys[91:]
 
     def crc14(self, a77):
         # https://gist.github.com/evansneath/4650991
@@ -442,30 +423,15 @@ class FT8_CODING:
 
     def ldpc_check(self, codeword):
         # does a 174-bit codeword pass the LDPC parity checks?
-        assert len(codeword) == 174
-
-        for e in self.nmx:
-            x = 0
-            for i in e:
-                if i != 0:
-                    x ^= codeword[i-1]
-            if x != 0:
-                return False
-        return True
+        return self.ldpc_parity(codeword) == 83
 
     def ldpc_parity(self, codeword):
-        # does a 174-bit codeword pass the LDPC parity checks?
+        # how many of the 83 LDPC parity checks does a codeword pass?
         assert len(codeword) == 174
 
-        cnt = 0
-        for e in self.nmx:
-            x = 0
-            for i in e:
-                if i != 0:
-                    x ^= codeword[i-1]
-            if x == 0:
-                cnt += 1
-        return cnt
+        # index 0 (no bit) picks the appended 0
+        cw = np.append(np.asarray(codeword, dtype=np.int32), 0)
+        return int(np.sum(cw[self.nmx - 1].sum(axis=1) % 2 == 0))
 
     def ldpc_encode(self, a91):
         # a91 is 91 bits of plain-text; returns a 174-bit codeword (0/1)
@@ -484,6 +450,15 @@ class FT8_CODING:
         # given a 174-bit codeword as an array of log-likelihood ratios,
         # return [ nok, plain ], where nok is the number of parity
         #        checks that worked out, should be 83=174-91.
+        # Runs _bp174() when Numba is available (see nckjit.py)
+        if nckjit.BACKEND == 'numba':
+            nok, cw = _bp174(np.asarray(llr174, dtype=np.float64),
+                             self.nmx, self.mnx, max_iters)
+            cw = [ int(x) for x in cw ]
+            return (91, cw) if nok == 91 else [ nok, cw ]
+        return self._ldpc_decode_numpy(llr174, max_iters)
+
+    def _ldpc_decode_numpy(self, llr174, max_iters):
 
         # LLR encoding: codeword[i] = log ( P(x=0) / P(x=1) )
         # typical: -4.5 is 'sure 1', 4.5 is 'sure 0'
@@ -500,11 +475,7 @@ class FT8_CODING:
         # what the bit's log-likelihood of being 0 is
         # based on information *other* than from that
         # parity check.
-        m = np.zeros((83, 174))
-
-        for i in range(174):
-            for j in range(83):
-                m[j][i] = llr174[i]
+        m = np.tile(np.asarray(llr174, dtype=np.float64), (83, 1))
 
         for iter in range(max_iters):
             # Eji
@@ -578,6 +549,83 @@ class FT8_CODING:
 
 # ---------------------------------------------------------------------------
 
+def _gen_sys():
+    # turn rawg into gen.
+    hex2 = { hex(i)[2]:i for i in range(16) }
+    gen = []
+    for e in FT8_CODING.rawg:
+        row = np.zeros(91, dtype=np.int32)
+        for i,c in enumerate(e):
+            x = hex2[c]
+            for j in range(0, 4):
+                ind = i*4 + (3-j)
+                if ind >= 0 and ind < 91:
+                    if (x & (1 << j)) != 0:
+                        row[ind] = 1
+                    else:
+                        row[ind] = 0
+        gen.append(row)
+
+    # turn gen[] into a systematic array by prepending
+    # a 91x91 identity matrix.
+    gen_sys = np.zeros((174, 91), dtype=np.int32)
+    gen_sys[91:,:] = gen
+    gen_sys[0:91,:] = np.eye(91, dtype=np.int32)
+    return { 'gen_sys': gen_sys }
+
+@nckjit.jit
+def _bp174(llr174, nmx, mnx, max_iters):
+    # FT8_CODING._ldpc_decode_numpy() as loops, for Numba: the same
+    # messages, in the same order. Returns (nok, cw)
+    m = np.empty((83, 174))
+    for j in range(83):
+        m[j, :] = llr174
+    e = np.zeros((83, 174))
+    cw = np.zeros(174, dtype=np.int64)
+    nok = 0
+    for iter in range(max_iters):
+        # messages from checks to bits
+        e[:, :] = 0.
+        for j in range(83):
+            for i in range(7):
+                if nmx[j, i] == 0:
+                    continue
+                a = 1.
+                for ii in range(7):
+                    if ii != i and nmx[j, ii] > 0:
+                        a *= np.tanh(m[j, nmx[j, ii]-1] / 2.0)
+                b = a if a < 0.99999 else 0.99
+                e[j, nmx[j, i]-1] = np.log((b + 1.0) / (1.0 - b))
+
+        # the corrected codeword, and its parity checks
+        for i in range(174):
+            ll = llr174[i] + e[mnx[i, 0]-1, i] + e[mnx[i, 1]-1, i] + \
+                 e[mnx[i, 2]-1, i]
+            cw[i] = 1 if ll < 0 else 0
+        nok = 0
+        for j in range(83):
+            x = 0
+            for i in range(7):
+                if nmx[j, i] != 0:
+                    x ^= cw[nmx[j, i]-1]
+            nok += x == 0
+        if nok == 83: # success!
+            return 91, cw
+
+        # messages from bits to checks
+        for i in range(174):
+            for j in range(3):
+                ll = llr174[i]
+                for jj in range(3):
+                    if jj != j:
+                        ll = ll + e[mnx[i, jj]-1, i]
+                m[mnx[i, j]-1, i] = ll
+
+    # could not decode.
+    return nok, cw
+
+# ---------------------------------------------------------------------------
+
 if __name__ == '__main__':
     import math
     import random
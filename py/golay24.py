@@ -93,20 +93,28 @@ def add_vectors(A,B):
         C[index] = A[index] ^ B[index]
     return C
 
-# Get generator matrix for the extended binary Golay code (G24)
-G = conjoin(I,B)
+G = Ht = None # computed by _matrices() on first use
 
-# Get transpose of parity-check matrix for G24
-Ht = transpose(conjoin(B,I))
+def _matrices():
+    global G, Ht
+    if G == None:
+        # Get generator matrix for the extended binary Golay code (G24)
+        G = conjoin(I,B)
+
+        # Get transpose of parity-check matrix for G24
+        Ht = transpose(conjoin(B,I))
+    return G, Ht
 
 
 # ---------------------------------------------------------------------------
 # API
 
 def golay_encode(b12):
+    G, _ = _matrices()
     return GF2_matrix([b12],G)[0]
 
 def golay_decode(b24):
+    _, Ht = _matrices()
     syndrome1 = GF2_matrix([b24], Ht)[0]
     weight = sum(syndrome1) #Weight of the syndrome
 
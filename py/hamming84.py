@@ -9,6 +9,8 @@
 # ---------------------------------------------------------------------------
 # internal
 
+h84_enc_lut = None # the tables, built by h84_init() on first use
+
 def _int_to_4bits(val):
     return [(val >> i) & 1 for i in range(4)][::-1]
     
@@ -78,6 +80,8 @@ def h84_init():
 
 def h84_encode(b4):
     # maps a list with 4 bits to a Hamming(8,4) codeword (list of 8 bits)
+    if h84_enc_lut == None:
+        h84_init()
     ndx = _bits_to_int(b4)
     e = h84_enc_lut[ndx]
     return _int_to_8bits(e)
@@ -86,6 +90,8 @@ def h84_decode(b8):
     # Decodes a 8 bit vector
     #   If correct, (True, <4 bit vector>) will be returned.
     #   If not correct(able), (False, <4 bit vector>) will be returned
+    if h84_enc_lut == None:
+        h84_init()
     ndx = _bits_to_int(b8)
     ok = True if h84_dec_ok[ndx//8] & (1 << (ndx % 8)) else False
     d = h84_dec_lut[ndx//2]
@@ -94,8 +100,6 @@ def h84_decode(b8):
 
 def h84_data_from_code(cw):
     return cw[2:3] + cw[4:7]
-    
-h84_init()
 
 
 # ---------------------------------------------------------------------------
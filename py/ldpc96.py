@@ -34,17 +34,19 @@ OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 '''
 
+import nckjit
+import ncktables
 import numpy as np
-import scipy
 
 # ---------------------------------------------------------------------------
 
 def _bitsandnodes(H):
     """Return bits and nodes of a parity-check matrix H."""
-    if type(H) != scipy.sparse.csr_matrix:
+    if isinstance(H, np.ndarray): # scipy.sparse only loaded when needed
         bits_indices, bits = np.where(H)
         nodes_indices, nodes = np.where(H.T)
     else:
+        import scipy.sparse
         bits_indices, bits = scipy.sparse.find(H)[:2]
         nodes_indices, nodes = scipy.sparse.find(H.T)[:2]
     bits_histogram = np.bincount(bits_indices)
@@ -86,6 +88,7 @@ def _gausselimination(A, b):
 
 # ---------------------------------------------------------------------------
 
+@nckjit.jit
 def _logbp_numba(bits_hist, bits_values, nodes_hist, nodes_values, Lc, Lq, Lr,
                  n_iter):
     """Perform inner ext LogBP solver."""
@@ -97,52 +100,84 @@ def _logbp_numba(bits_hist, bits_values, nodes_hist, nodes_values, Lc, Lq, Lr,
     for i in range(m):
         # ni = bits[i]
         ff = bits_hist[i]
-        ni = bits_values[bits_counter: bits_counter + ff]
-        bits_counter += ff
-        for j in ni:
-            nij = ni[:]
-
-            X = np.ones(n_messages)
-            if n_iter == 0:
-                for kk in range(len(nij)):
-                    if nij[kk] != j:
-                        X *= np.tanh(0.5 * Lc[nij[kk]])
-            else:
-                for kk in range(len(nij)):
-                    if nij[kk] != j:
-                        X *= np.tanh(0.5 * Lq[i, nij[kk]])
-            num = 1 + X
-            denom = 1 - X
-            for ll in range(n_messages):
-                if num[ll] == 0:
-                    Lr[i, j, ll] = -1
-                elif denom[ll] == 0:
-                    Lr[i, j, ll] = 1
+        for jj in range(ff):
+            j = bits_values[bits_counter + jj]
+            for k in range(n_messages):
+                X = 1.
+                for kk in range(ff):
+                    b = bits_values[bits_counter + kk]
+                    if b != j:
+                        if n_iter == 0:
+                            X *= np.tanh(0.5 * Lc[b, k])
+                        else:
+                            X *= np.tanh(0.5 * Lq[i, b, k])
+                num = 1 + X
+                denom = 1 - X
+                if num == 0:
+                    Lr[i, j, k] = -1
+                elif denom == 0:
+                    Lr[i, j, k] = 1
                 else:
-                    Lr[i, j, ll] = np.log(num[ll] / denom[ll])
+                    Lr[i, j, k] = np.log(num / denom)
+        bits_counter += ff
 
     # step 2 : Vertical
     for j in range(n):
         # mj = nodes[j]
         ff = nodes_hist[j]
-        mj = nodes_values[nodes_counter: nodes_counter + ff]
+        for ii in range(ff):
+            i = nodes_values[nodes_counter + ii]
+            for k in range(n_messages):
+                Lq[i, j, k] = Lc[j, k]
+                for kk in range(ff):
+                    if nodes_values[nodes_counter + kk] != i:
+                        Lq[i, j, k] += Lr[nodes_values[nodes_counter + kk],
+                                          j, k]
         nodes_counter += ff
-        for i in mj:
-            mji = mj[:]
-            Lq[i, j] = Lc[j]
-
-            for kk in range(len(mji)):
-                if mji[kk] != i:
-                    Lq[i, j] += Lr[mji[kk], j]
 
     # LLR a posteriori:
     L_posteriori = np.zeros((n, n_messages))
     nodes_counter = 0
     for j in range(n):
         ff = nodes_hist[j]
-        mj = nodes_values[nodes_counter: nodes_counter + ff]
+        for k in range(n_messages):
+            L_posteriori[j, k] = Lc[j, k]
+            for kk in range(ff):
+                L_posteriori[j, k] += Lr[nodes_values[nodes_counter + kk],
+                                         j, k]
         nodes_counter += ff
-        L_posteriori[j] = Lc[j] + Lr[mj, j].sum(axis=0)
+
+    return Lq, Lr, L_posteriori
+
+def _logbp_numpy(bits_hist, bits_values, nodes_hist, nodes_values, Lc, Lq, Lr,
+                 n_iter):
+    """The same LogBP step, vectorized over all edges of H."""
+    m, n, n_messages = Lr.shape
+    # edge e joins check ci[e] and bit bi[e], in slot[e] of the check
+    ci, bi = np.repeat(np.arange(m), bits_hist), bits_values
+    slot = np.arange(len(bi)) - np.repeat(np.cumsum(bits_hist) - bits_hist,
+                                          bits_hist)
+    # step 1 : Horizontal, products of all other edges of a check from
+    # products of the edges left and right of it
+    T = np.ones((m, bits_hist.max() + 2, n_messages)) # ones at both ends
+    T[ci, slot + 1] = np.tanh(0.5 * (Lc[bi] if n_iter == 0 else Lq[ci, bi]))
+    left = np.cumprod(T, axis=1)
+    right = np.cumprod(T[:, ::-1], axis=1)[:, ::-1]
+    X = left[ci, slot] * right[ci, slot + 2]
+    num = 1 + X
+    denom = 1 - X
+    with np.errstate(divide='ignore', invalid='ignore'):
+        L = np.log(num / denom)
+    L = np.where(denom == 0, 1, L)
+    Lr[ci, bi] = np.where(num == 0, -1, L)
+
+    # step 2 : Vertical, all checks of a bit but the one it goes to
+    col = Lr.sum(axis=0)
+    mi, nj = nodes_values, np.repeat(np.arange(n), nodes_hist)
+    Lq[mi, nj] = Lc[nj] + col[nj] - Lr[mi, nj]
+
+    # LLR a posteriori:
+    L_posteriori = Lc + col
 
     return Lq, Lr, L_posteriori
 
@@ -172,7 +207,7 @@ def decode_post(H, y, snr, maxiter=1000):
     _n_bits = np.unique(H.sum(0))
     _n_nodes = np.unique(H.sum(1))
 
-    solver = _logbp_numba
+    solver = _logbp_numba if nckjit.BACKEND == 'numba' else _logbp_numpy
 
     var = 10 ** (-snr / 10)
 
@@ -203,24 +238,49 @@ def decode_post(H, y, snr, maxiter=1000):
 
 # ---------------------------------------------------------------------------
 
-import ldpc96_cfg as cfg
-
-LDPC_G = np.array(cfg.LDPC_G)
-LDPC_H = np.array(cfg.LDPC_H)
+# LDPC_G and LDPC_H are converted from ldpc96_cfg on first use, and
+# cached on disk (see ncktables.py) with the decoding matrix D
+
+def _tables():
+    import ldpc96_cfg as cfg
+    G = np.array(cfg.LDPC_G)
+    # _data_from_code() is linear over GF(2): D has its images of the
+    # unit vectors as columns
+    D = np.array([ _data_from_code(cfg.LDPC_G, [ int(x) for x in e ])
+                   for e in np.eye(G.shape[0], dtype=int) ]).T
+    return { 'G': G, 'H': np.array(cfg.LDPC_H), 'D': D }
+
+def _matrices():
+    t = ncktables.load('ldpc96', None, _tables, deps=['ldpc96_cfg'])
+    return t['G'], t['H']
+
+def __getattr__(name):
+    if name == 'LDPC_G':
+        return _matrices()[0]
+    if name == 'LDPC_H':
+        return _matrices()[1]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def l96_encode(b50):
+    LDPC_G, _ = _matrices()
     return [ int(x % 2) for x in LDPC_G.dot(b50) ]
 
 def l96_decode(llr96):
     # b96 = [ 4. if b else -4. for b in b96 ]
+    _, LDPC_H = _matrices()
     r = decode_post(LDPC_H, np.array(llr96), 0, maxiter=200)
     return [ 1 if x > 0 else 0 for x in r[1] ]
 
 def l96_data_from_code(cw):
-    rtG, rx = _gausselimination(cfg.LDPC_G, cw)
+    D = ncktables.load('ldpc96', None, _tables, deps=['ldpc96_cfg'])['D']
+    return [ int(x) for x in D.dot(cw) % 2 ]
+
+def _data_from_code(G, cw):
+    # solves G.x = cw by elimination, G as a list of rows
+    rtG, rx = _gausselimination(G, cw)
     rtG = np.array(rtG)
 
-    n, k = LDPC_G.shape
+    n, k = rtG.shape
     message = [0] * k
     message[k - 1] = rx[k - 1]
     for i in reversed(range(k - 1)):
@@ -1,34 +1,29 @@
 #!/usr/bin/env python3
 
 # mk_nck-fer_plot.py
-# renders the collected FER data (in one or more JSON files)
+# renders the collected FER data (in one or more result stores, legacy
+# JSON files are accepted, too)
 
 # (C) Jan 2026 <christian.tschudin@unibas.ch> HB9HUH/K6CFT
 # SW released under the MIT license
 
 
-import json
 import matplotlib.pyplot as plt
+from nckstore import open_store
 
 # ---------------------------------------------------------------------------
 
 def render(fname, ax):
 
-    with open(fname, 'r') as f:
-        simu = json.load(f)
+    store = open_store(fname)
+    cfg = store.cfg()
 
-    snr_values = [ x/2-2. for x in range(31) ]
-
-    kr_list = sorted(simu['data'].keys(), key=lambda x:float(x), reverse=True)
+    pts = store.points()
+    kr_list = sorted(set([ p['kr'] for p in pts ]), reverse=True)
     for kr in kr_list:
-        snr_list = sorted(simu['data'][kr].keys(), key=lambda x:float(x))
-        data = []
-        for snr in snr_list:
-            line = simu['data'][kr][snr]
-            v = [ float(x.split('=')[-1]) for x in line.split('\n') ]
-            v = [ 1e-4 if x == 0 else x for x in v ]
-            data.append(v)
-        ax.semilogy(snr_values[:len(data)], data, label=f'{kr} Baud')
+        snr = [ p['snr'] for p in pts if p['kr'] == kr ]
+        fer = [ max(1e-4, p['fer']) for p in pts if p['kr'] == kr ]
+        ax.semilogy(snr, fer, label=f'{kr} Baud')
 
     ax.set_ylim([1e-3,1.25])
     ax.set_xlabel("SNR/dB")
@@ -37,15 +32,16 @@ def render(fname, ax):
     pos = sys.argv[1].rfind('.')
     FNAME = sys.argv[1] if pos < 0 else sys.argv[1][:pos]
     ax.text(10.3, 1.3, FNAME, va='top', rotation='vertical', fontsize=8)
-    ax.text(10.3, 0.00105, simu["cfg"]["utc"], rotation='vertical', fontsize=8)
+    ax.text(10.3, 0.00105, store.last_update(), rotation='vertical', fontsize=8)
 
     ax.grid(True, which="both")
     ax.legend(loc='lower right')
 
-    bw = simu['cfg']['bw']
-    fec = simu['cfg']['ecc']
+    bw = cfg['bw']
+    fec = cfg['ecc']
     fec = "no FEC" if fec == None else f"FEC={fec}"
-    counts = f"{simu['cfg']['dlength']}+{simu['cfg']['olength']} bits"
+    counts = f"{cfg['dlength']}+{cfg['olength']} bits"
+    store.close()
 
     ax.set_title(f"BW={bw}Hz / {fec} / {counts}",
                  fontsize=11)
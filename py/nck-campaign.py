@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+
+# nck-campaign.py
+# runs a grid of FER simulations described in a JSON spec file, caching
+# each point under a hash of its configuration and of the code version
+
+# SW released under the MIT license
+
+# example spec (lists expand to a BW x KR x ECC x M x FS x SNR grid):
+#
+#   {
+#     "name"  : "fer",
+#     "bw"    : [500],
+#     "kr"    : [70, 50, 35, 20],
+#     "ecc"   : ["golay24", "ldpc96"],
+#     "M"     : [2],
+#     "fs"    : [1000],
+#     "snr"   : {"from": -2, "to": 9.5, "step": 0.5},
+#     "length": 92,
+#     "rounds": 3000
+#   }
+#
+# % ./nck-campaign.py fer.json            # computes the missing points
+# % ./nck-campaign.py -n fer.json         # only lists what is missing
+# % ./nck-campaign.py -x out fer.json     # ... and exports one result store
+#                                         #   per BW/ECC/M/FS combination
+# % ./mk_nck-fer_plot.py out/fer-500-golay24-96-M2-1000.sqlite
+#
+# Points are cached in the cache directory, one result store per point.
+# Any change in the simulation's configuration or in the code of the
+# involved modules leads to a new hash, only those points are recomputed.
+# Interrupted points resume from their last checkpoint.
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime,UTC
+import hashlib
+import importlib
+import itertools
+import json
+import nckfec
+import ncksim
+from nckstore import RESULTSTORE
+import os
+import sys
+
+# ---------------------------------------------------------------------------
+
+def code_version():
+    # hash over the source of all local modules the simulation depends on.
+    # The codecs are loaded on first use (see nckfec.py): import them all
+    # first, a change in any of them must change the hash
+    for mods in nckfec.MODULES.values():
+        for m in mods:
+            importlib.import_module(m)
+    here = os.path.dirname(os.path.abspath(__file__))
+    h = hashlib.sha256()
+    for name in sorted(sys.modules):
+        fn = getattr(sys.modules[name], '__file__', None)
+        if name in ['__main__', 'nckstore'] or fn == None or \
+           os.path.dirname(os.path.abspath(fn)) != here:
+            continue
+        with open(fn, 'rb') as f:
+            h.update(name.encode() + b'\0' + f.read())
+    return h.hexdigest()[:16]
+
+def expand(spec):
+    # returns the list of point configurations of a campaign spec
+    def as_list(v):
+        return v if type(v) == list else [v]
+
+    snr = spec['snr']
+    if type(snr) == dict:
+        n = int(round((snr['to'] - snr['from']) / snr['step'])) + 1
+        snr = [ snr['from'] + i * snr['step'] for i in range(n) ]
+
+    pts = []
+    for bw, kr, ecc, M, fs, s in itertools.product(
+            as_list(spec['bw']), as_list(spec['kr']), as_list(spec['ecc']),
+            as_list(spec.get('M', 2)), as_list(spec['fs']), as_list(snr)):
+        length, _ = ncksim.frame_lengths(ecc, spec.get('length', 48))
+        pts.append({ 'fs': fs, 'cf': spec.get('cf', 0), 'bw': bw,
+                     'kr': float(kr), 'M': M, 'ecc': ecc, 'length': length,
+                     'fft': spec.get('fft', False), 'snr': float(s) })
+    return pts
+
+def point_key(cfg, spec, version):
+    # content address of a point: configuration, stop criteria, code
+    j = json.dumps({ 'cfg': cfg, 'rounds': spec.get('rounds', 3000),
+                     'max_ferrs': spec.get('max_ferrs', 60),
+                     'version': version }, sort_keys=True)
+    return hashlib.sha256(j.encode()).hexdigest()
+
+def cache_path(cachedir, key):
+    return os.path.join(cachedir, key[:2], key + '.sqlite')
+
+def run_point(fname, cfg, rounds, checkpoint, max_ferrs):
+    # executed in a worker process
+    os.makedirs(os.path.dirname(fname), exist_ok=True)
+    store = RESULTSTORE(fname, cfg)
+    p = ncksim.simulate_point(store, cfg, rounds, checkpoint, max_ferrs,
+                              verbose=False)
+    store.close()
+    return p
+
+def lookup(fname):
+    # returns the totals of a cached point, or None
+    if not os.path.isfile(fname):
+        return None
+    store = RESULTSTORE(fname)
+    cfg = store.cfg()
+    p = store.point(cfg['kr'], cfg['snr'])
+    store.close()
+    return p
+
+def export(spec, pts, results, outdir):
+    # writes one result store per BW/ECC/M/FS combination, in the format
+    # expected by mk_nck-fer_plot.py
+    os.makedirs(outdir, exist_ok=True)
+    groups = {}
+    for cfg, p in zip(pts, results):
+        if p == None or p['frames'] == 0:
+            continue
+        g = (cfg['bw'], cfg['ecc'], cfg['length'], cfg['M'], cfg['fs'])
+        groups.setdefault(g, []).append((cfg, p))
+    for (bw, ecc, length, M, fs), lst in groups.items():
+        dlength, olength = ncksim.frame_lengths(ecc, length)
+        fname = os.path.join(outdir, f"{spec.get('name', 'campaign')}" + \
+                             f"-{bw}-{ecc}-{dlength+olength}-M{M}-{fs}.sqlite")
+        if os.path.isfile(fname): # derived artifact, always rewritten
+            os.remove(fname)
+        store = RESULTSTORE(fname, {
+            'bw'     : bw,
+            'ecc'    : ecc,
+            'fs'     : fs,
+            'M'      : M,
+            'krl'    : sorted(set([ c['kr'] for c,_ in lst ]), reverse=True),
+            'dlength': dlength,
+            'olength': olength,
+            'rounds' : spec.get('rounds', 3000),
+            'utc'    : str(datetime.now(UTC))[:19]
+        })
+        for cfg, p in lst:
+            store.checkpoint(cfg['kr'], cfg['snr'], None, p['frames'],
+                             p['bit_errs'], p['frame_errs'], p['cpu'],
+                             p['final'])
+        store.close()
+        print(f"--> {fname}")
+
+# ---------------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('spec', type=str,
+                        help="campaign spec file (JSON)")
+    parser.add_argument('-c', '--cache', type=str, default='nck-cache',
+                        metavar='DIR', help="cache directory." + \
+                        " Default=nck-cache")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help="number of worker processes. Default=#cores")
+    parser.add_argument('-n', '--dry-run', action='store_true',
+                        help="only list the points that need computing")
+    parser.add_argument('-x', '--export', type=str, metavar='DIR',
+                        help="export result stores for mk_nck-fer_plot.py")
+    args = parser.parse_args(sys.argv[1:])
+
+    with open(args.spec, 'r') as f:
+        spec = json.load(f)
+    version = code_version()
+    pts = expand(spec)
+    fnames = [ cache_path(args.cache, point_key(cfg, spec, version))
+               for cfg in pts ]
+    results = [ lookup(fn) for fn in fnames ]
+    todo = [ i for i,p in enumerate(results) if p == None or not p['final'] ]
+    print(f"code version {version}: {len(pts)} points," + \
+          f" {len(pts) - len(todo)} cached, {len(todo)} to compute")
+
+    if args.dry_run:
+        for i in todo:
+            print(pts[i])
+        sys.exit(0)
+
+    if len(todo) > 0:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            futures = { pool.submit(run_point, fnames[i], pts[i],
+                                    spec.get('rounds', 3000),
+                                    spec.get('checkpoint', 100),
+                                    spec.get('max_ferrs', 60)) : i
+                        for i in todo }
+            for n, fut in enumerate(as_completed(futures)):
+                i = futures[fut]
+                results[i] = p = fut.result()
+                cfg = pts[i]
+                print(f"[{n+1}/{len(todo)}] bw={cfg['bw']} kr={cfg['kr']}",
+                      f"ecc={cfg['ecc']} M={cfg['M']} fs={cfg['fs']}",
+                      f"snr={cfg['snr']} rounds={p['frames']}",
+                      f"fer={'%e' % p['fer']}")
+
+    if args.export != None:
+        export(spec, pts, results, args.export)
+
+# eof
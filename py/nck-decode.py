@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+# nck-decode.py
+# headless decoder for long recordings (WAV or raw int16 PCM)
+
+# SW released under the MIT license
+
+# The recording is memory-mapped and read in overlapping chunks by a
+# background thread, peak memory does not depend on the file's length.
+# Decoded frames are printed with their offset into the recording.
+#
+# % ./nck-decode.py -b 500 -c 1250 -k 20 -e ldpc96 capture.wav
+# % ./nck-decode.py -r -f 12000 -b 500 -c 1250 -k 20 -e ft8 capture.pcm
+# % ./nck-decode.py -q 1 -e ldpc96 monitor.wav   # mostly idle band
+# % ./nck-decode.py -T 4 -e ldpc96 capture.wav   # on four cores
+# % ./nck-decode.py -p 4 -e ldpc96 capture.wav   # in four processes
+# % ./nck-decode.py -P -e ldpc96 capture.wav     # float32 buffers
+
+import argparse
+import json
+import nckfec
+import nckio
+from ncklib import NCK
+from nckrx import CHUNKDEMOD, DECODEPOOL, DEMODPROCS, FRAMEFINDER, \
+                  SQUELCH
+import numpy as np
+import sys
+import time
+
+# ---------------------------------------------------------------------------
+
+parser = argparse.ArgumentParser()
+parser.add_argument('file', type=str,
+                          help="WAV file, or raw PCM with -r")
+parser.add_argument('-b', '--bw', type=float, default=500,
+                          help="signal bandwidth in Hz. Default=500")
+parser.add_argument('-C', '--chunk', type=float, default=60, metavar='SEC',
+                          help="chunk length in seconds. Default=60")
+parser.add_argument('-c', '--centerfreq', type=int, default=1250,
+                          help="Default=1250")
+parser.add_argument('-e', '--ecc', default=None, choices=nckfec.ECCS,
+                          help="error correcting coding. Default=None")
+parser.add_argument('-f', '--fs', type=int, default=None,
+                          help="sampling frequency of raw PCM files")
+parser.add_argument('-j', '--json', action='store_true',
+                          help="print decodes as JSON lines")
+parser.add_argument('-k', '--kr', type=float, default=20,
+                          help="keying rate in Baud. Default=20")
+parser.add_argument('-l', '--length', type=int, default=48,
+                          help="payload len in bits. Default=48." + \
+                               " Is adusted depending on -ecc")
+parser.add_argument('-P', '--float32', action='store_true',
+                          help="single precision signal buffers, half" + \
+                               " the memory traffic")
+parser.add_argument('-p', '--procs', type=int, default=None,
+                          help="demodulate and decode candidates in N" + \
+                               " processes, overrides -T")
+parser.add_argument('-q', '--squelch', type=float, default=None, metavar='dB',
+                          help="demodulate only where the in-band power" + \
+                               " is dB above the noise floor")
+parser.add_argument('-r', '--raw', action='store_true',
+                          help="file is raw mono int16 PCM")
+parser.add_argument('-T', '--threads', type=int, default=1,
+                          help="demodulate and decode candidates in N" + \
+                               " threads. Default=1")
+parser.add_argument('-t', '--threshold', type=float, default=1.4,
+                          help="frame detection threshold, relative to" + \
+                               " the noise floor. Default=1.4")
+
+args = parser.parse_args(sys.argv[1:])
+
+fs, samples = nckio.open_audio(args.file, fs=args.fs, raw=args.raw)
+dtype = np.float32 if args.float32 else np.float64
+nck = NCK(FS=fs, CF=args.centerfreq, BW=args.bw, KR=args.kr, dtype=dtype)
+_, nsym = nckfec.frame_bits(args.ecc, args.length)
+
+if args.procs != None: # before READAHEAD's thread: the workers fork
+    pool = DEMODPROCS(nck, args.procs)
+elif args.threads != 1:
+    pool = DECODEPOOL(lambda: NCK(FS=fs, CF=args.centerfreq, BW=args.bw,
+                                  KR=args.kr, dtype=dtype), args.threads)
+else:
+    pool = None
+T = (nsym + 2) / args.kr # frame duration
+squelch = None if args.squelch == None else \
+          SQUELCH(nck, open_db=args.squelch, close_db=args.squelch/2,
+                  learn=5*T)
+demod = CHUNKDEMOD(nck, chunk_sec=args.chunk, squelch=squelch,
+                   pre=T, hang=4*T, pool=pool)
+finder = FRAMEFINDER(nck, nsym, ecc=args.ecc, threshold=args.threshold,
+                     pool=pool)
+
+def hms(t):
+    return f"{int(t//3600):02d}:{int(t%3600//60):02d}:{t%60:06.3f}"
+
+cpu = time.process_time()
+cnt = 0
+def show(frames):
+    global cnt
+    for f in frames:
+        cnt += 1
+        if args.json:
+            print(json.dumps(f), flush=True)
+        else:
+            print(f"{hms(f['t'])} score={'%.1f' % f['score']}",
+                  f"{'ok ' if f['ok'] else '?? '}{f['data']}", flush=True)
+
+for start, chunk in nckio.READAHEAD(samples, demod.hop, demod.margin,
+                                    dtype=dtype):
+    show(finder.feed(*demod.process(start, chunk)))
+show(finder.flush())
+if pool != None:
+    pool.close()
+
+print(f"{cnt} frame(s) in {'%.1f' % (len(samples)/fs)} sec of audio," + \
+      f" {'%.1f' % (time.process_time() - cpu)} sec CPU" + \
+      ("" if squelch == None else
+       f", {100 * demod.active / max(1, demod.samples):.0f}% demodulated"),
+      file=sys.stderr)
+
+# eof
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+# nck-mkcorpus.py
+# generates a ground-truth corpus of impaired NCK recordings
+
+# SW released under the MIT license
+
+# Frames cycle through all combinations of the given SNR values and
+# fading channels. Frame i is generated from the seed (SEED, i), so a
+# corpus can be regenerated, and extended, bit for bit. The corpus is
+# committed in batches, an interrupted run continues where it stopped
+# when started again with the same options.
+#
+# % ./nck-mkcorpus.py -n 2000 -e ldpc96 -s=-2:6:1 corpus.nckc
+# % ./nck-mkcorpus.py -n 4000 -e ldpc96 -s=-2:6:1 -F good,poor -j 4 hf.nckc
+# % ./nck-replay.py corpus.nckc
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime,UTC
+import itertools
+import nckchannel
+from nckcorpus import CORPUS
+import nckfec
+import ncksim
+import numpy as np
+import sys
+
+# ---------------------------------------------------------------------------
+
+def snr_values(spec):
+    # '3' or '-2,0,3' or FROM:TO:STEP
+    if ':' in spec:
+        a, b, step = [ float(x) for x in spec.split(':') ]
+        return [ round(a + i * step, 3)
+                 for i in range(int(round((b - a) / step)) + 1) ]
+    return [ float(x) for x in spec.split(',') ]
+
+parser = argparse.ArgumentParser()
+parser.add_argument('corpus', type=str,
+                          help="corpus file, created or extended")
+parser.add_argument('-B', '--batch', type=int, default=100,
+                          help="frames per commit. Default=100")
+parser.add_argument('-b', '--bw', type=float, default=500,
+                          help="signal bandwidth in Hz. Default=500")
+parser.add_argument('-c', '--centerfreq', type=int, default=1250,
+                          help="Default=1250")
+parser.add_argument('-e', '--ecc', default=None, choices=nckfec.ECCS,
+                          help="error correcting coding. Default=None")
+parser.add_argument('-F', '--fading', type=str, default='none',
+                          help="comma separated list of 'none' and " + \
+                               f"{', '.join(nckchannel.WATTERSON.keys())}." + \
+                               " Default=none")
+parser.add_argument('-f', '--fs', type=int, default=6000,
+                          help="sampling frequency in Hz. Default=6000")
+parser.add_argument('-j', '--jobs', type=int, default=1,
+                          help="worker processes. Default=1")
+parser.add_argument('-k', '--kr', type=float, default=20,
+                          help="keying rate in Baud. Default=20")
+parser.add_argument('-l', '--length', type=int, default=48,
+                          help="payload len in bits. Default=48." + \
+                               " Is adusted depending on -ecc")
+parser.add_argument('-M', '--arity', type=int, default=2,
+                          help="# of distinguished noise levels (2 or" + \
+                               " more), default=2")
+parser.add_argument('-n', '--count', type=int, default=1000,
+                          help="frames the corpus should hold. Default=1000")
+parser.add_argument('-S', '--seed', type=int, default=1,
+                          help="Default=1")
+parser.add_argument('-s', '--snr', type=str, default='3', metavar='dB',
+                          help="SNR values: a list as -s=-2,0,3 or" + \
+                               " -s=FROM:TO:STEP. Default=3")
+parser.add_argument('-t', '--fft', action='store_true',
+                          help="use FFT instead of our LPF,HPF")
+
+args = parser.parse_args(sys.argv[1:])
+
+combos = list(itertools.product(snr_values(args.snr),
+                                [ None if f == 'none' else f
+                                  for f in args.fading.split(',') ]))
+
+def frame_cfg(i):
+    snr, fading = combos[i % len(combos)]
+    cfg = { 'fs': args.fs, 'cf': args.centerfreq, 'bw': args.bw,
+            'kr': args.kr, 'M': args.arity, 'ecc': args.ecc,
+            'length': nckfec.frame_bits(args.ecc, args.length)[0],
+            'fft': args.fft, 'snr': snr }
+    if fading != None:
+        cfg['fading'] = fading
+    return cfg
+
+def generate(i):
+    cfg = frame_cfg(i)
+    rng = np.random.default_rng([args.seed, i])
+    truth, audio = ncksim.make_recording(cfg, rng)
+    return dict(cfg, seed=[args.seed, i], **truth), audio
+
+if __name__ == '__main__':
+    corpus = CORPUS(args.corpus, 'a',
+                    info={'utc': str(datetime.now(UTC))[:19]})
+    first = len(corpus)
+    if first > 0:
+        print(f"{args.corpus}: {first} frames, continuing")
+    with ProcessPoolExecutor(args.jobs) as pool:
+        for b in range(first, args.count, args.batch):
+            idx = range(b, min(args.count, b + args.batch))
+            for meta, audio in pool.map(generate, idx):
+                corpus.append(meta, audio)
+            corpus.commit()
+            print(f"\r{len(corpus)}/{args.count} frames", end='',
+                  file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+    corpus.close()
+    print(f"--> {args.corpus}")
+
+# eof
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+# nck-replay.py
+# decodes a ground-truth corpus and reports decode rate and throughput
+
+# SW released under the MIT license
+
+# Every frame is demodulated in the window where its signal is and
+# decoded with its FEC scheme, the result is compared with the sent
+# payload. By default each frame is received with the configuration it
+# was sent with, the options override it: this compares decoder
+# settings, or versions of the code, on the same recordings.
+#
+# decoded  payload equals what was sent
+# false    FEC reported success, but the payload is wrong
+# ber      bit errors before FEC
+# fr/cpu-s frames per CPU second, demodulation and FEC
+#
+# % ./nck-replay.py corpus.nckc
+# % ./nck-replay.py -t corpus.nckc          # ... with FFT filters
+# % ./nck-replay.py -j corpus.nckc > run.json
+# % ./nck-replay.py -T 8 corpus.nckc       # frames in eight threads
+# % ./nck-replay.py -i corpus.nckc          # integrate-and-dump detector
+
+import argparse
+from nckcorpus import CORPUS
+import json
+import nckfec
+from ncklib import NCK
+from nckrx import DECODEPOOL
+import ncksim
+import sys
+import threading
+import time
+
+# ---------------------------------------------------------------------------
+
+parser = argparse.ArgumentParser()
+parser.add_argument('corpus', type=str,
+                          help="corpus file (see nck-mkcorpus.py)")
+parser.add_argument('-b', '--bw', type=float, default=None,
+                          help="signal bandwidth in Hz")
+parser.add_argument('-c', '--centerfreq', type=int, default=None,
+                          help="center frequency in Hz")
+parser.add_argument('-e', '--ecc', default=None, choices=nckfec.ECCS,
+                          help="error correcting coding")
+parser.add_argument('-i', '--iad', action='store_true',
+                          help="integrate-and-dump detector, one r1 per" + \
+                               " symbol")
+parser.add_argument('-j', '--json', action='store_true',
+                          help="print the results as JSON")
+parser.add_argument('-k', '--kr', type=float, default=None,
+                          help="keying rate in Baud")
+parser.add_argument('-n', '--count', type=int, default=None,
+                          help="replay the first N frames only")
+parser.add_argument('-T', '--threads', type=int, default=1,
+                          help="replay frames in N threads. Default=1")
+parser.add_argument('-t', '--fft', action='store_true',
+                          help="use FFT instead of our LPF,HPF")
+
+args = parser.parse_args(sys.argv[1:])
+
+corpus = CORPUS(args.corpus)
+override = { k: v for k, v in [('bw', args.bw), ('cf', args.centerfreq),
+                                ('kr', args.kr), ('ecc', args.ecc),
+                                ('fft', args.fft or None),
+                                ('iad', args.iad or None)] if v != None }
+_local = threading.local() # demodulators, per thread and configuration
+
+def receive(i):
+    # returns (decoded, false ok, bit errors, bits, CPU seconds) of
+    # frame i
+    t0 = time.thread_time()
+    m, audio = corpus.audio(i)
+    cfg = dict(m, **override)
+    M = cfg.get('M', 2)
+    key = (cfg['fs'], cfg['cf'], cfg['bw'], cfg['kr'], M, cfg['fft'])
+    _nck = _local.__dict__.setdefault('nck', {})
+    if not key in _nck:
+        _nck[key] = NCK(FS=cfg['fs'], CF=cfg['cf'], BW=cfg['bw'],
+                        KR=cfg['kr'], M=M, USE_FFT=cfg['fft'])
+    nck = _nck[key]
+
+    window = (m['start'], m['start'] + m['siglen'])
+    if cfg.get('iad'):
+        _, r1, msg, pos = nck.demodulate_symbols(audio, window=window)
+        pos = range(len(r1)) # r1 is per symbol
+    else:
+        _, r1, msg, pos = nck.demodulate(audio, window=window)
+    nsym = len(m['symbols'])
+    bits = [ int(b) for b in m['bits'] ]
+    if M == 2:
+        soft = [ -8 * r1[p] for p in pos[1:1+nsym] ]
+    else:
+        soft = [ 4 if b else -4 for b in
+                 ncksim.symbols_to_bits(msg[1:1+nsym], M)[:len(bits)] ]
+    soft += [ 0 ] * (len(bits) - len(soft)) # cut short by an override
+    ok, data = nckfec.decode(cfg['ecc'], soft)
+    right = ''.join([str(b) for b in data]) == m['data']
+    berr = sum([ (x > 0) != b for x, b in zip(soft, bits) ])
+    return right, ok and not right, berr, len(bits), \
+           time.thread_time() - t0
+
+groups = {}
+cpu = time.process_time()
+n = len(corpus) if args.count == None else min(args.count, len(corpus))
+if args.threads == 1:
+    results = map(receive, range(n))
+else:
+    pool = DECODEPOOL(threads=args.threads)
+    results = pool.map(receive, range(n))
+    pool.close()
+for i, res in enumerate(results):
+    m = corpus.meta(i)
+    key = (m['snr'], m.get('fading'))
+    g = groups.setdefault(key, [0, 0, 0, 0, 0, 0.])
+    for j, v in enumerate((1,) + res):
+        g[j] += v
+cpu = time.process_time() - cpu
+
+def result(g):
+    frames, right, false, berr, nbits, t = g
+    return { 'frames': frames, 'decoded': right / frames,
+             'false': false, 'ber': berr / max(1, nbits),
+             'cpu': t, 'fps': frames / max(t, 1e-9) }
+
+def points(): # sorted by fading channel and SNR
+    return sorted(groups.items(), key=lambda x: (str(x[0][1]), x[0][0]))
+
+tot = [ sum(x) for x in zip(*groups.values()) ] if groups else [0]*6
+tot[5] = cpu
+if args.json:
+    print(json.dumps({ 'corpus': args.corpus, 'override': override,
+                       'points': [ dict(snr=k[0], fading=k[1], **result(g))
+                                   for k, g in points() ],
+                       'total': result(tot) if n > 0 else {} }))
+else:
+    for (snr, fading), g in points():
+        r = result(g)
+        print(f"snr={snr:5.1f} fading={str(fading):8s} {r['frames']:6d}" + \
+              f" frames  decoded {100*r['decoded']:5.1f}%" + \
+              f"  false {r['false']:3d}  ber {100*r['ber']:5.2f}%" + \
+              f"  {r['fps']:6.1f} fr/cpu-s")
+    if n > 0:
+        r = result(tot)
+        print(f"{n} frames, decoded {100*r['decoded']:.1f}%," + \
+              f" {r['false']} false, {cpu:.1f} sec CPU," + \
+              f" {r['fps']:.1f} frames/CPU-sec")
+
+# eof
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+
+# nck-rx.py
+# live receiver: decodes raw int16 PCM from stdin, a FIFO or a socket
+
+# SW released under the MIT license
+
+# Three asyncio stages are connected by bounded queues:
+#
+#   reader --(sample blocks)--> DSP --(r1 segments)--> frame finder/FEC
+#
+# DSP and FEC run in worker threads of their own. The reader never
+# waits for the other stages: when the block queue is full, the block
+# is dropped (and counted), and the DSP stage restarts after the gap.
+# A slow FEC stage backs up into the DSP stage, not into the reader.
+#
+# Frames are printed as JSON lines on stdout, queue depths and drops
+# as JSON lines on stderr.
+#
+# % arecord -f S16_LE -r 12000 -c 1 -t raw | ./nck-rx.py -f 12000 -
+# % ./nck-rx.py -f 12000 -e ldpc96 unix:/tmp/pcm.sock
+# % ./nck-rx.py -f 12000 -e ldpc96 tcp:localhost:7355
+# % ./nck-rx.py -f 6000 -e ldpc96 -p 1 capture.pcm # replays in real time
+# % ./nck-rx.py -f 12000 -e ldpc96 -q 1 -        # squelch, for idle bands
+
+import argparse
+import asyncio
+import concurrent.futures
+from datetime import datetime,UTC
+import json
+import nckfec
+import nckio
+from ncklib import NCK
+from nckrx import CHUNKDEMOD, FRAMEFINDER, SQUELCH
+import numpy as np
+import sys
+import time
+
+BLOCK = 4096 # bytes per read
+
+# ---------------------------------------------------------------------------
+
+parser = argparse.ArgumentParser()
+parser.add_argument('source', type=str,
+                          help="'-' for stdin, a file or FIFO, " + \
+                               "unix:PATH or tcp:HOST:PORT")
+parser.add_argument('-b', '--bw', type=float, default=500,
+                          help="signal bandwidth in Hz. Default=500")
+parser.add_argument('-C', '--chunk', type=float, default=5, metavar='SEC',
+                          help="DSP chunk length in seconds. Default=5")
+parser.add_argument('-c', '--centerfreq', type=int, default=1250,
+                          help="Default=1250")
+parser.add_argument('-e', '--ecc', default=None, choices=nckfec.ECCS,
+                          help="error correcting coding. Default=None")
+parser.add_argument('-f', '--fs', type=int, default=12000,
+                          help="sampling frequency. Default=12000")
+parser.add_argument('-k', '--kr', type=float, default=20,
+                          help="keying rate in Baud. Default=20")
+parser.add_argument('-l', '--length', type=int, default=48,
+                          help="payload len in bits. Default=48." + \
+                               " Is adusted depending on -ecc")
+parser.add_argument('-p', '--pace', type=float, default=None, metavar='X',
+                          help="read the source at X times the sampling" + \
+                               " rate (to replay a file)")
+parser.add_argument('-Q', '--queue', type=float, default=10, metavar='SEC',
+                          help="audio held in the block queue before" + \
+                               " dropping. Default=10")
+parser.add_argument('-q', '--squelch', type=float, default=None, metavar='dB',
+                          help="demodulate only where the in-band power" + \
+                               " is dB above the noise floor")
+parser.add_argument('-S', '--stats', type=float, default=10, metavar='SEC',
+                          help="stats reporting interval. Default=10")
+parser.add_argument('-t', '--threshold', type=float, default=1.4,
+                          help="frame detection threshold, relative to" + \
+                               " the noise floor. Default=1.4")
+
+args = parser.parse_args(sys.argv[1:])
+
+nck = NCK(FS=args.fs, CF=args.centerfreq, BW=args.bw, KR=args.kr)
+_, nsym = nckfec.frame_bits(args.ecc, args.length)
+T = (nsym + 2) / args.kr # frame duration
+squelch = None if args.squelch == None else \
+          SQUELCH(nck, open_db=args.squelch, close_db=args.squelch/2,
+                  learn=5*T)
+demod = CHUNKDEMOD(nck, chunk_sec=args.chunk, squelch=squelch,
+                   pre=T, hang=4*T)
+finder = FRAMEFINDER(nck, nsym, ecc=args.ecc, threshold=args.threshold)
+
+stats = {
+    'samples' : 0, # read from the source
+    'dropped' : 0, # samples dropped because the block queue was full
+    'gaps'    : 0,
+    'chunks'  : 0, # demodulated
+    'active'  : 1.0, # fraction of the samples the squelch let through
+    'frames'  : 0,
+    'blockq'  : 0, 'blockq_max': 0,
+    'r1q'     : 0, 'r1q_max'   : 0,
+}
+
+# ---------------------------------------------------------------------------
+
+async def open_source(src):
+    # returns an async function reading up to n bytes, b'' at the end
+    if src.startswith('unix:') or src.startswith('tcp:'):
+        if src.startswith('unix:'):
+            r, w = await asyncio.open_unix_connection(src[5:])
+        else:
+            host, port = src[4:].rsplit(':', 1)
+            r, w = await asyncio.open_connection(host, int(port))
+        # holding on to the writer, the connection closes with it
+        return lambda n, w=w: r.read(n)
+    # pipes, FIFOs and files: blocking reads in a thread
+    f = sys.stdin.buffer.raw if src == '-' else open(src, 'rb', buffering=0)
+    return lambda n: asyncio.to_thread(f.read, n)
+
+async def reader(read, blockq):
+    # reads blocks of samples and queues them with their stream index
+    pos, rest = 0, b''
+    t0 = time.monotonic()
+    while True:
+        data = await read(BLOCK)
+        if not data:
+            break
+        data = rest + data
+        n = len(data) // 2
+        rest = data[2*n:]
+        try:
+            blockq.put_nowait((pos, np.frombuffer(data[:2*n], dtype='<i2')))
+        except asyncio.QueueFull:
+            stats['dropped'] += n
+        pos += n
+        stats['samples'] = pos
+        stats['blockq_max'] = max(stats['blockq_max'], blockq.qsize())
+        if args.pace != None:
+            await asyncio.sleep(max(0, t0 + pos / args.fs / args.pace -
+                                       time.monotonic()))
+    await blockq.put(None)
+
+async def dsp(blockq, r1q, pool):
+    # collects blocks into overlapping chunks and demodulates them
+    loop = asyncio.get_running_loop()
+    q = demod.q # restarts on the demodulator's (and squelch's) grid
+    ratio = 2 * nck.BW / nck.FS
+    buf, buf_pos, start = None, 0, 0 # buf[0] is sample buf_pos
+
+    async def run(a, b):
+        # demodulates from start on, with buf[a:b] as chunk
+        r = await loop.run_in_executor(pool, demod.process, start,
+                                       buf[a - buf_pos:b - buf_pos], a)
+        stats['chunks'] += 1
+        stats['active'] = round(demod.active / max(1, demod.samples), 3)
+        await r1q.put(r)
+        stats['r1q_max'] = max(stats['r1q_max'], r1q.qsize())
+
+    while True:
+        item = await blockq.get()
+        if item == None:
+            break
+        pos, block = item
+        if buf is None or pos != buf_pos + len(buf): # first block, or gap
+            if buf is not None:
+                stats['gaps'] += 1
+            s = (pos + q - 1) // q * q # restart on an aligned sample
+            if s >= pos + len(block):
+                buf = None
+                continue
+            block, pos = block[s - pos:], s
+            buf, buf_pos, start = np.zeros(0), pos, pos
+            await r1q.put((int(round(pos * ratio)), None))
+        buf = np.concatenate((buf, nckio.to_float(block)))
+        while buf_pos + len(buf) >= start + demod.hop + demod.margin:
+            await run(max(buf_pos, start - demod.margin),
+                      start + demod.hop + demod.margin)
+            start += demod.hop
+            keep = start - demod.margin
+            if keep > buf_pos:
+                buf, buf_pos = buf[keep - buf_pos:], keep
+    if buf is not None and buf_pos + len(buf) > start: # the rest
+        await run(max(buf_pos, start - demod.margin), buf_pos + len(buf))
+    await r1q.put(None)
+
+async def fec(r1q, pool):
+    # finds and decodes frames, prints them as JSON lines
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await r1q.get()
+        if item == None: # end of stream
+            frames = await loop.run_in_executor(pool, finder.flush)
+        else:
+            pos, r1 = item
+            if r1 is None: # stream (re)starts at pos
+                finder.reset(pos)
+                continue
+            frames = await loop.run_in_executor(pool, finder.feed, pos, r1)
+        for f in frames:
+            f['utc'] = str(datetime.now(UTC))[:19]
+            stats['frames'] += 1
+            print(json.dumps(f), flush=True)
+        if item == None:
+            break
+
+async def report(blockq, r1q):
+    while True:
+        await asyncio.sleep(args.stats)
+        stats['blockq'], stats['r1q'] = blockq.qsize(), r1q.qsize()
+        print(json.dumps({'stats': stats}), file=sys.stderr, flush=True)
+
+async def main():
+    read = await open_source(args.source)
+    blockq = asyncio.Queue(maxsize=max(1, int(args.queue*args.fs*2/BLOCK)))
+    r1q = asyncio.Queue(maxsize=4)
+    rep = asyncio.create_task(report(blockq, r1q))
+    with concurrent.futures.ThreadPoolExecutor(1) as dsp_pool, \
+         concurrent.futures.ThreadPoolExecutor(1) as fec_pool:
+        await asyncio.gather(reader(read, blockq),
+                             dsp(blockq, r1q, dsp_pool),
+                             fec(r1q, fec_pool))
+    rep.cancel()
+    stats['blockq'], stats['r1q'] = 0, 0
+    print(json.dumps({'stats': stats}), file=sys.stderr, flush=True)
+
+try:
+    asyncio.run(main())
+except KeyboardInterrupt:
+    pass
+
+# eof
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+# nck-scan.py
+# finds NCK signals of unknown center frequency and bandwidth in a
+# recording (WAV or raw int16 PCM)
+
+# SW released under the MIT license
+
+# One pass over the recording, see nckscan.py. Prints the candidates,
+# best first, with the options to decode them:
+#
+# % ./nck-scan.py capture.wav
+# % ./nck-scan.py -b 250,500,1000,2000 -B 100:3000 -k 50 capture.wav
+# % ./nck-scan.py -j -r -f 12000 capture.pcm > candidates.json
+
+import argparse
+import json
+import nckio
+import nckscan
+import sys
+import time
+
+# ---------------------------------------------------------------------------
+
+parser = argparse.ArgumentParser()
+parser.add_argument('file', type=str,
+                          help="WAV file, or raw PCM with -r")
+parser.add_argument('-B', '--band', type=str, default='200:2900',
+                          metavar='LO:HI',
+                          help="passband to scan, in Hz. Default=200:2900")
+parser.add_argument('-b', '--bws', type=str, default='250,500,1000',
+                          help="bandwidths to try, in Hz." + \
+                               " Default=250,500,1000")
+parser.add_argument('-f', '--fs', type=int, default=None,
+                          help="sampling frequency of raw PCM files")
+parser.add_argument('-j', '--json', action='store_true',
+                          help="print the candidates as JSON lines")
+parser.add_argument('-k', '--kr', type=float, default=20,
+                          help="fastest keying rate expected, in Baud." + \
+                               " Default=20")
+parser.add_argument('-n', '--count', type=int, default=20,
+                          help="at most N candidates. Default=20")
+parser.add_argument('-r', '--raw', action='store_true',
+                          help="file is raw mono int16 PCM")
+parser.add_argument('-s', '--slot', type=float, default=1.0, metavar='SEC',
+                          help="time resolution. Default=1.0")
+parser.add_argument('-t', '--threshold', type=float, default=2.5,
+                          help="required score, 1 is noise. Default=2.5")
+
+args = parser.parse_args(sys.argv[1:])
+
+fs, samples = nckio.open_audio(args.file, fs=args.fs, raw=args.raw)
+band = [ float(x) for x in args.band.split(':') ]
+band[1] = min(band[1], fs / 2)
+bws = [ float(x) for x in args.bws.split(',') ]
+
+cpu = time.process_time()
+found = nckscan.scan(samples, fs, kr=args.kr, bws=bws, band=band,
+                     slot=args.slot, threshold=args.threshold, n=args.count)
+
+for c in found:
+    if args.json:
+        print(json.dumps(c))
+    else:
+        print(f"t={c['t']:8.1f} dur={c['dur']:5.1f}" + \
+              f"  -c {c['cf']:.0f} -b {c['bw']:.0f}" + \
+              f"  score={c['score']:.1f} (hue {c['hue']:.1f}," + \
+              f" power {c['power']:.1f})")
+print(f"{len(found)} candidate(s) in {len(samples)/fs:.1f} sec of audio," + \
+      f" {time.process_time() - cpu:.1f} sec CPU", file=sys.stderr)
+
+# eof
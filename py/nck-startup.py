@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+# nck-startup.py
+# startup-time benchmark: imports and first decode, per decode path
+
+# SW released under the MIT license
+
+# Every path runs in a fresh interpreter with 'python -X importtime'.
+# The table shows the summed import time, the number of modules loaded,
+# whether plotting was loaded, and the wall time until the first frame
+# is decoded. The 'eager' row loads what demo-nck.py and the codec
+# modules used to load up front (matplotlib, scipy.io, all four codecs
+# with their tables), as a reference.
+#
+# % ./nck-startup.py
+# % ./nck-startup.py -n 5 -e ldpc96
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# ---------------------------------------------------------------------------
+
+ECCS = ['none', 'ft8', 'golay24', 'hamming84', 'ldpc96']
+
+IMPORTS = "import nckfec, nckio, ncklib, nckrx"
+
+EAGER = """
+import ft8_coding, golay24, hamming84, ldpc96
+import matplotlib.pyplot, scipy.io.wavfile
+ft8_coding.FT8_CODING(); golay24._matrices(); hamming84.h84_init()
+ldpc96._matrices()
+"""
+
+DECODE = """
+import numpy as np
+ecc = {ecc!r}
+length, nsym = nckfec.frame_bits(ecc, 48)
+data = list(np.random.randint(2, size=length))
+nck = ncklib.NCK(FS=6000, CF=1250, BW=500, KR=20)
+audio = nck.modulate(nckfec.encode(ecc, data))
+audio /= np.max(np.abs(audio))
+rcvd = np.concatenate((np.zeros(6000), audio, np.zeros(6000)))
+rcvd += 0.01 * np.random.randn(len(rcvd))
+_, r1, msg, pos = nck.demodulate(rcvd, window=(6000, 6000 + len(audio)))
+ok, d = nckfec.decode(ecc, np.array([ -8 * r1[p] for p in pos[1:1+nsym] ]))
+assert ok and d[:length] == data
+"""
+
+def run(code):
+    # returns (import ms, modules, plotting loaded, wall ms)
+    t0 = time.perf_counter()
+    p = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                       capture_output=True, text=True,
+                       cwd=os.path.dirname(os.path.abspath(__file__)))
+    wall = 1000 * (time.perf_counter() - t0)
+    if p.returncode != 0:
+        sys.exit(p.stderr.splitlines()[-1])
+    us, mods = 0, []
+    for line in p.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        f = line[12:].split('|')
+        if not f[0].strip().isdigit(): # the header line
+            continue
+        us += int(f[0])
+        mods.append(f[2].strip())
+    return us / 1000, len(mods), 'matplotlib' in mods, wall
+
+# ---------------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-e', '--ecc', default=None, choices=ECCS,
+                              help="only this decode path. Default=all")
+    parser.add_argument('-n', '--runs', type=int, default=3,
+                              help="fastest of N runs. Default=3")
+    args = parser.parse_args(sys.argv[1:])
+
+    paths = [('eager (imports only)', EAGER + IMPORTS),
+             ('lazy (imports only)', IMPORTS)]
+    for ecc in ECCS if args.ecc == None else [args.ecc]:
+        code = IMPORTS + DECODE.format(ecc=None if ecc == 'none' else ecc)
+        paths.append((f"first decode, {ecc}", code))
+
+    print(f"{'path':28s} {'import ms':>9s} {'modules':>7s} {'plot':>4s}" + \
+          f" {'wall ms':>8s}")
+    for name, code in paths:
+        best = min([ run(code) for _ in range(args.runs) ],
+                   key=lambda r: r[3])
+        print(f"{name:28s} {best[0]:9.1f} {best[1]:7d}" + \
+              f" {'yes' if best[2] else 'no':>4s} {best[3]:8.1f}")
+
+# eof
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+# nck-tx.py
+# streaming transmitter: continuous beacon of NCK frames, as WAV file,
+# raw PCM file or raw PCM on stdout
+
+# SW released under the MIT license
+
+# Frames are modulated symbol by symbol (NCK.modulate_stream) and the
+# audio is written block by block, the first samples come out at once
+# and memory use does not depend on the number of frames. Each frame's
+# payload is logged on stderr.
+#
+# % ./nck-tx.py -e ldpc96 -n 10 -o beacon.wav
+# % ./nck-tx.py -e ldpc96 -o - | aplay -f S16_LE -r 12000 -c 1
+# % ./nck-tx.py -f 6000 -e ldpc96 -o - | ./nck-rx.py -f 6000 -e ldpc96 -p 1 -
+
+import argparse
+import nckfec
+import nckio
+from ncklib import NCK
+import numpy as np
+import sys
+
+# ---------------------------------------------------------------------------
+
+parser = argparse.ArgumentParser()
+parser.add_argument('-a', '--amplitude', type=float, default=0.5,
+                          help="output scale, full scale is 1. Default=0.5")
+parser.add_argument('-b', '--bw', type=float, default=500,
+                          help="signal bandwidth in Hz. Default=500")
+parser.add_argument('-c', '--centerfreq', type=int, default=1250,
+                          help="Default=1250")
+parser.add_argument('-e', '--ecc', default=None, choices=nckfec.ECCS,
+                          help="error correcting coding. Default=None")
+parser.add_argument('-f', '--fs', type=int, default=12000,
+                          help="sampling frequency. Default=12000")
+parser.add_argument('-g', '--gap', type=float, default=2, metavar='SEC',
+                          help="silence between frames. Default=2")
+parser.add_argument('-k', '--kr', type=float, default=20,
+                          help="keying rate in Baud. Default=20")
+parser.add_argument('-l', '--length', type=int, default=48,
+                          help="payload len in bits. Default=48." + \
+                               " Is adusted depending on -ecc")
+parser.add_argument('-m', '--message', type=str, default=None,
+                          help="payload as string of 0 and 1," + \
+                               " default is a random payload per frame")
+parser.add_argument('-n', '--count', type=int, default=0,
+                          help="number of frames, 0 is endless. Default=0")
+parser.add_argument('-o', '--output', type=str, default='out.wav',
+                          help="WAV file, or '-' for raw PCM on stdout." + \
+                               " Default=out.wav")
+parser.add_argument('-r', '--raw', action='store_true',
+                          help="write raw int16 PCM instead of WAV")
+
+args = parser.parse_args(sys.argv[1:])
+args.length, _ = nckfec.frame_bits(args.ecc, args.length)
+if args.message != None:
+    assert len(args.message) == args.length, \
+           f"the payload must have {args.length} bits"
+
+nck = NCK(FS=args.fs, CF=args.centerfreq, BW=args.bw, KR=args.kr)
+out = nckio.AUDIOWRITER(args.output, args.fs,
+                        raw=args.raw or args.output == '-',
+                        scale=args.amplitude)
+
+def symbols():
+    # the frames, each followed by the gap, as one stream of symbols
+    gap = [None] * int(round(args.gap * args.kr))
+    t = 0 # in symbols
+    i = 0
+    while args.count == 0 or i < args.count:
+        if args.message != None:
+            data = [ int(x) for x in args.message ]
+        else:
+            data = [ int(x) for x in np.random.randint(2, size=args.length) ]
+        bits = nckfec.encode(args.ecc, data)
+        print(f"{t / args.kr:.3f} {''.join([str(x) for x in data])}",
+              file=sys.stderr, flush=True)
+        yield from bits
+        yield from gap
+        t += 2 + len(bits) + len(gap) # incl. the ramps
+        i += 1
+
+try:
+    for block in nck.modulate_stream(symbols()):
+        out.write(block)
+except (KeyboardInterrupt, BrokenPipeError):
+    pass
+finally:
+    if out.clipped > 0:
+        print(f"warning: {out.clipped} samples clipped," + \
+              " reduce the amplitude", file=sys.stderr)
+    out.close()
+
+# eof
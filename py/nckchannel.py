@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+
+# nckchannel.py
+# channel simulation for NCK: AWGN, HF fading (Watterson), QSB, sample
+# clock offset, frequency offset and carrier birdies
+
+# SW released under the MIT license
+
+# All functions work on 1-D signals as well as on 2-D arrays (one frame
+# per row), the rows are impaired independently. The CHANNEL class keeps
+# its state between calls of apply() and can thus be fed a long signal
+# block by block. Filter designs are computed once, in the constructor.
+
+import numpy as np
+import scipy.signal as signal
+
+# ---------------------------------------------------------------------------
+# whole-frame helpers, as used by the demo and the FER simulation
+
+def pad(audio, FS, padlen):
+    # pads padlen seconds of silence before and after the signal
+    z = np.zeros(audio.shape[:-1] + (int(padlen * FS),), dtype=audio.dtype)
+    return np.concatenate((z, audio, z), axis=-1)
+
+def awgn(audio, snr, bw, fs, siglen=None, rng=None):
+    # adds uniform white noise over the full channel (0..fs/2) such that
+    # the SNR, measured in the signal's bandwidth bw, is 'snr' dB.
+    # siglen is the length of the signal part, if audio includes padding.
+    # The noise has audio's dtype (float32 or float64), powers are
+    # summed in float64
+    siglen = audio.shape[-1] if siglen == None else siglen
+    dt = audio.dtype if audio.dtype == np.float32 else np.float64
+    if rng == None:
+        noise = np.random.rand(*audio.shape).astype(dt, copy=False)
+    else:
+        noise = rng.random(audio.shape, dtype=dt)
+    noise *= 2
+    noise -= 1
+    pwrS = np.sum(audio*audio, axis=-1, keepdims=True, # signal power
+                  dtype=np.float64)
+    pwrN = np.sum(noise*noise, axis=-1, keepdims=True, # for full channel BW
+                  dtype=np.float64)
+    # adjust for padding
+    pwrN *= siglen / audio.shape[-1]
+    # adjust for signal bandwidth
+    pwrN *= bw / (fs/2)
+    # adjust to requested SNR level
+    x = 10 * np.log10(pwrS/pwrN) - float(snr)
+    noise *= np.sqrt(np.power(10, (x/10))).astype(dt)
+    noise += audio
+    return noise
+
+def birdies(audio, fs, freqs, amplitude, t0=0):
+    # adds carriers of the given frequencies (t0: index of first sample)
+    t = (t0 + np.arange(audio.shape[-1])) / fs
+    for f in freqs:
+        audio = audio + (amplitude * np.cos(2 * np.pi * f * t)).astype(
+                            audio.dtype, copy=False)
+    return audio
+
+# ---------------------------------------------------------------------------
+
+WATTERSON = { # CCIR 520 channels: (Doppler spread in Hz, path delay in ms)
+    'good'    : (0.1, 0.5),
+    'moderate': (0.5, 1.0),
+    'poor'    : (1.0, 2.0),
+    'flutter' : (10., 0.5),
+}
+
+class CHANNEL:
+
+    def __init__(self, FS=12000, BW=500, snr=None, sig_pwr=1.0,
+                 fading=None, qsb=None, sco_ppm=0, foffset=0,
+                 birdies=None, rng=None):
+        # FS       sampling freq, in Hz
+        # BW       signal bandwidth, the SNR is relative to it
+        # snr      SNR in dB, or None for no noise
+        # sig_pwr  mean power per sample of the signal, reference for snr
+        # fading   None, one of WATTERSON's keys, or (spread Hz, delay ms)
+        # qsb      None, or (rate Hz, depth 0..1): slow sinusoidal fading
+        # sco_ppm  sample clock offset of the receiver, in ppm
+        # foffset  frequency offset, in Hz
+        # birdies  list of (freq Hz, amplitude) carriers
+        self.FS = FS
+        self.BW = BW
+        self.rng = np.random.default_rng() if rng == None else rng
+        self.t = 0 # number of samples processed so far
+
+        self.noise_amp = 0
+        if snr != None: # uniform noise over 0..FS/2 has power amp^2/3
+            pwrN = sig_pwr * (FS/2) / BW / np.power(10, snr/10)
+            self.noise_amp = np.sqrt(3 * pwrN)
+
+        if type(fading) == str:
+            fading = WATTERSON[fading]
+        self.fading = fading
+        if fading != None:
+            spread, delay = fading
+            # tap gains are generated at a low rate and interpolated:
+            # complex white noise through a Gaussian filter whose
+            # (two-sided, 2 sigma) bandwidth equals the Doppler spread
+            self.g_rate = max(10., 8 * spread)
+            self.g_step = FS / self.g_rate # FS samples per gain sample
+            sigma_t = 1 / (np.sqrt(2) * np.pi * spread) * self.g_rate
+            n = int(3 * sigma_t)
+            h = np.exp(-0.5 * (np.arange(-n, n+1) / sigma_t)**2)
+            self.g_filter = h / np.sqrt(np.sum(h*h) * 2) # 2 paths
+            self.delay = int(round(delay * FS / 1000))
+        self.qsb = qsb
+        self.qsb_phase = 2 * np.pi * self.rng.random() if qsb != None else 0
+        self.sco = 1 + sco_ppm * 1e-6
+        self.foffset = foffset
+        self.birdies = [] if birdies == None else birdies
+
+        if fading != None or foffset != 0:
+            # FIR Hilbert transformer for the analytic signal
+            self.hilbert = signal.remez(101, [0.01, 0.49], [1], fs=1,
+                                        type='hilbert')
+        self.state = None
+
+    def latency(self):
+        # samples the output lags behind the input (Hilbert FIR)
+        return 50 if self.fading != None or self.foffset != 0 else 0
+
+    def _init_state(self, rows):
+        s = {}
+        s['sco_buf'] = np.zeros((rows, 1))
+        s['sco_pos'] = 1.0
+        if self.fading != None or self.foffset != 0:
+            s['h_zi'] = np.zeros((rows, len(self.hilbert)-1))
+            s['h_dly'] = np.zeros((rows, self.latency()))
+        if self.fading != None:
+            m = len(self.g_filter)
+            s['g_zi'] = np.zeros((2, rows, m-1), dtype=complex)
+            # prime the gain filters with white noise
+            _, s['g_zi'] = self._gains_raw(rows, 2*m, s['g_zi'])
+            s['g_last'], s['g_zi'] = self._gains_raw(rows, 1, s['g_zi'])
+            s['g_pos'] = 0.0 # fractional position within the gain step
+            s['p_dly'] = np.zeros((rows, self.delay), dtype=complex)
+        self.state = s
+
+    def _gains_raw(self, rows, n, zi):
+        w = (self.rng.standard_normal((2, rows, n)) + \
+             1j * self.rng.standard_normal((2, rows, n))) / np.sqrt(2)
+        g, zi = signal.lfilter(self.g_filter, 1, w, axis=-1, zi=zi)
+        return g, zi
+
+    def _gains(self, rows, n):
+        # returns the tap gains of the two paths for the next n samples,
+        # by linear interpolation of the low rate gain process
+        s = self.state
+        pos = s['g_pos'] + np.arange(n) / self.g_step # in gain samples
+        cnt = int(np.floor(pos[-1])) + 1
+        g, s['g_zi'] = self._gains_raw(rows, cnt, s['g_zi'])
+        g = np.concatenate((s['g_last'], g), axis=-1)
+        i = np.floor(pos).astype(int)
+        f = pos - i
+        out = g[..., i] * (1 - f) + g[..., i+1] * f
+        nxt = pos[-1] + 1 / self.g_step
+        base = int(np.floor(nxt))
+        s['g_last'] = g[..., base:base+1]
+        s['g_pos'] = nxt - base
+        return out
+
+    def _resample(self, x):
+        # sample clock offset: cubic (Catmull-Rom) interpolation at
+        # positions advancing by self.sco input samples per output sample
+        s = self.state
+        buf = np.concatenate((s['sco_buf'], x), axis=-1)
+        n = int(np.floor((buf.shape[-1] - 3 - s['sco_pos']) / self.sco)) + 1
+        if n <= 0:
+            s['sco_buf'] = buf
+            return buf[:, :0]
+        pos = s['sco_pos'] + self.sco * np.arange(n)
+        i = np.floor(pos).astype(int)
+        f = pos - i
+        p0, p1, p2, p3 = buf[:, i-1], buf[:, i], buf[:, i+1], buf[:, i+2]
+        y = p1 + 0.5 * f * (p2 - p0 + f * (2*p0 - 5*p1 + 4*p2 - p3 + \
+                                           f * (3*(p1 - p2) + p3 - p0)))
+        nxt = s['sco_pos'] + self.sco * n
+        keep = int(np.floor(nxt)) - 1
+        s['sco_buf'] = buf[:, keep:]
+        s['sco_pos'] = nxt - keep
+        return y
+
+    def apply(self, block):
+        # impairs the next block of samples, a 1-D or 2-D array (rows are
+        # independent channels). The number of returned samples can differ
+        # by a few from the input if a sample clock offset is set.
+        # float32 blocks come back as float32, the impairments are
+        # computed in float64 (complex gains and phases)
+        dt = np.float32 if np.asarray(block).dtype == np.float32 else float
+        x = np.atleast_2d(np.asarray(block, dtype=float))
+        if self.state == None:
+            self._init_state(x.shape[0])
+        s = self.state
+
+        if self.sco != 1:
+            x = self._resample(x)
+        n = x.shape[-1]
+
+        if self.fading != None or self.foffset != 0:
+            # analytic signal (the real part is delayed to match the FIR)
+            im, s['h_zi'] = signal.lfilter(self.hilbert, 1, x, axis=-1,
+                                           zi=s['h_zi'])
+            re = np.concatenate((s['h_dly'], x), axis=-1)
+            s['h_dly'] = re[:, n:]
+            z = re[:, :n] + 1j * im
+
+            if self.fading != None: # two paths of equal average power
+                g = self._gains(x.shape[0], n)
+                zd = np.concatenate((s['p_dly'], z), axis=-1)
+                s['p_dly'] = zd[:, n:]
+                z = g[0] * z + g[1] * zd[:, :n]
+            if self.foffset != 0:
+                z = z * np.exp(2j * np.pi * self.foffset * \
+                               (self.t + np.arange(n)) / self.FS)
+            x = z.real
+
+        if self.qsb != None:
+            rate, depth = self.qsb
+            t = (self.t + np.arange(n)) / self.FS
+            x = x * (1 - depth * 0.5 * (1 + np.cos(2 * np.pi * rate * t + \
+                                                    self.qsb_phase)))
+        if self.noise_amp > 0:
+            x = x + self.noise_amp * (2 * self.rng.random(x.shape) - 1)
+        for f, a in self.birdies:
+            x = x + a * np.cos(2 * np.pi * f * \
+                               (self.t + np.arange(n)) / self.FS)
+        self.t += n
+
+        x = x.astype(dt, copy=False)
+        return x if np.ndim(block) > 1 else x[0]
+
+    pass
+
+# ---------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    import time
+
+    FS, BW, ROWS, LEN = 6000, 500, 32, 6000 * 20
+    rng = np.random.default_rng(1)
+    frames = 2 * rng.random((ROWS, LEN)) - 1
+
+    def bench(name, **kw):
+        ch = CHANNEL(FS=FS, BW=BW, rng=rng, **kw)
+        t0 = time.process_time()
+        for i in range(0, LEN, FS): # stream in 1 sec blocks
+            ch.apply(frames[:, i:i+FS])
+        t = time.process_time() - t0
+        print(f"{name:24s} {ROWS*LEN/t/1e6:6.1f} Msamples/s")
+
+    t0 = time.process_time()
+    awgn(frames, 3, BW, FS, rng=rng)
+    print(f"{'awgn() (whole frames)':24s}",
+          f"{ROWS*LEN/(time.process_time()-t0)/1e6:6.1f} Msamples/s")
+    bench('AWGN', snr=3)
+    bench('AWGN+QSB+birdies', snr=3, qsb=(0.2, 0.5),
+          birdies=[(1500, 0.1), (1600, 0.1)])
+    bench('AWGN+SCO', snr=3, sco_ppm=50)
+    bench('AWGN+foffset', snr=3, foffset=1.5)
+    bench('AWGN+Watterson poor', snr=3, fading='poor')
+    bench('all impairments', snr=3, fading='moderate', qsb=(0.2, 0.5),
+          sco_ppm=50, foffset=1.5, birdies=[(1500, 0.1)])
+
+    # fading statistics: average power gain should be close to 1
+    ch = CHANNEL(FS=FS, BW=BW, fading='poor', rng=rng)
+    tone = np.cos(2 * np.pi * 1000 * np.arange(FS * 600) / FS)
+    y = np.concatenate([ ch.apply(tone[i:i+FS])
+                         for i in range(0, len(tone), FS) ])
+    print("Watterson 'poor', mean power gain over 10 min:",
+          np.round(np.mean(y[FS:]**2) / np.mean(tone**2), 3))
+
+# eof
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+# nckcorpus.py
+# ground-truth corpus: many impaired recordings of single frames, with
+# what was sent, in one indexed and memory-mapped file
+
+# SW released under the MIT license
+
+# File layout:
+#
+#   header   MAGIC, offset and length of the index (HEADER bytes)
+#   samples  all recordings back to back, little-endian int16
+#   index    JSON: the corpus' info dict and one dict per frame
+#
+# The samples are memory-mapped, frame(i) is a view into the file:
+# access to any frame is random and costs nothing until its samples
+# are read. A frame's dict holds its simulation configuration (see
+# ncksim.py: fs, cf, bw, kr, M, ecc, length, fft, snr, impairments),
+# the seed it was generated from, the sent payload, bits and symbols
+# as strings of digits, and where the recording and the signal are:
+#   offset, n   first sample and number of samples in the file
+#   start, siglen  the signal part, in samples of the recording
+#
+# Appending overwrites the old index with the new samples, then
+# writes the new index and, last, the header. Frames are appended in
+# batches with commit(): an interrupted generator loses its current
+# batch, the corpus stays usable unless it dies within commit().
+#
+# usage:
+#   % ./nckcorpus.py corpus.nckc             # summary of a corpus
+#   % ./nckcorpus.py corpus.nckc 17          # one frame's ground truth
+
+import json
+import nckio
+import numpy as np
+import os
+import struct
+
+MAGIC   = b'NCKCORP1'
+HEADER  = 64 # bytes
+VERSION = 1
+
+# ---------------------------------------------------------------------------
+
+class CORPUS:
+
+    def __init__(self, fname, mode='r', info=None):
+        # mode 'r' opens an existing corpus, 'a' opens it for appending
+        # and creates it (with the info dict) if it does not exist
+        self.fname = fname
+        self.mode = mode
+        self.pending, self.pending_n = [], 0
+        if mode == 'a' and not os.path.exists(fname):
+            self.info = dict(info or {}, version=VERSION)
+            self.frames = []
+            self.nsamples = 0
+            with open(fname, 'wb') as f:
+                f.write(b'\0' * HEADER)
+            self._write_index()
+        else:
+            self._read_index()
+        self._map()
+
+    def _read_index(self):
+        with open(self.fname, 'rb') as f:
+            hdr = f.read(HEADER)
+            if len(hdr) < HEADER or hdr[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{self.fname}: not an NCK corpus")
+            pos, size = struct.unpack_from('<QQ', hdr, len(MAGIC))
+            f.seek(pos)
+            idx = json.loads(f.read(size))
+        self.info, self.frames = idx['info'], idx['frames']
+        self.nsamples = (pos - HEADER) // 2
+
+    def _write_index(self):
+        # the index goes after the samples, then the header points to it
+        pos = HEADER + 2 * self.nsamples
+        idx = json.dumps({'info': self.info, 'frames': self.frames},
+                         separators=(',', ':')).encode()
+        with open(self.fname, 'r+b') as f:
+            f.seek(pos)
+            f.write(idx)
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+            f.seek(0)
+            f.write(MAGIC + struct.pack('<QQ', pos, len(idx)))
+
+    def _map(self):
+        self.samples = np.memmap(self.fname, dtype='<i2', mode='r',
+                                 offset=HEADER, shape=(self.nsamples,)) \
+                       if self.nsamples > 0 else np.zeros(0, dtype='<i2')
+
+    def __len__(self):
+        return len(self.frames)
+
+    def meta(self, i):
+        # ground truth and configuration of frame i
+        return self.frames[i]
+
+    def frame(self, i):
+        # returns (meta, samples) of frame i, samples as int16 view
+        m = self.frames[i]
+        return m, self.samples[m['offset'] : m['offset'] + m['n']]
+
+    def audio(self, i):
+        # returns (meta, samples) of frame i, samples as float in [-1..1]
+        m, s = self.frame(i)
+        return m, nckio.to_float(s)
+
+    def append(self, meta, audio):
+        # queues one recording (float in [-1..1]) with its meta dict,
+        # it becomes part of the corpus with commit()
+        assert self.mode == 'a', "corpus not opened for appending"
+        pcm = np.clip(np.round(np.asarray(audio) * 32767), -32767, 32767)
+        meta = dict(meta, offset=self.nsamples + self.pending_n, n=len(pcm))
+        self.pending.append((meta, pcm.astype('<i2')))
+        self.pending_n += len(pcm)
+
+    def commit(self):
+        if len(self.pending) == 0:
+            return
+        self.samples = None # release the map before the file changes
+        with open(self.fname, 'r+b') as f:
+            f.seek(HEADER + 2 * self.nsamples)
+            for _, pcm in self.pending:
+                f.write(pcm.tobytes())
+        self.frames += [ m for m, _ in self.pending ]
+        self.nsamples += self.pending_n
+        self.pending, self.pending_n = [], 0
+        self._write_index()
+        self._map()
+
+    def close(self):
+        if self.mode == 'a':
+            self.commit()
+        self.samples = None
+
+    pass
+
+# ---------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    import sys
+
+    c = CORPUS(sys.argv[1])
+    if len(sys.argv) > 2:
+        print(json.dumps(c.meta(int(sys.argv[2])), indent=2))
+    else:
+        print(c.info)
+        cnt = {}
+        for m in c.frames:
+            k = (m['bw'], m['kr'], m['M'], m['ecc'], m.get('fading'),
+                 m['snr'])
+            cnt[k] = cnt.get(k, 0) + 1
+        for (bw, kr, M, ecc, fading, snr), n in sorted(cnt.items(),
+                                                key=lambda x: (str(x[0][:5]), x[0][5])):
+            print(f"bw={bw} kr={kr} M={M} ecc={ecc} fading={fading}",
+                  f"snr={snr}: {n} frames")
+        print(f"{len(c)} frames, {c.nsamples} samples," + \
+              f" {os.path.getsize(c.fname)/1e6:.1f} MB")
+
+# eof
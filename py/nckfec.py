@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+# nckfec.py
+# uniform access to the FEC schemes, for receivers that need to know
+# whether a frame was decoded correctly
+
+# SW released under the MIT license
+
+# Soft values follow the convention of the r1 signal: a received bit is
+# represented by -8*r1, i.e. positive values stand for a '1'.
+#
+# The codec modules are imported on first use: a decoder that only
+# needs one of them does not pay for loading the others.
+
+import numpy as np
+
+ECCS = ['ft8', 'golay24', 'hamming84', 'ldpc96']
+
+# the modules each scheme loads, for hashing the code (nck-campaign.py)
+MODULES = { 'ft8': ['ft8_coding'], 'golay24': ['golay24'],
+            'hamming84': ['hamming84'], 'ldpc96': ['ldpc96', 'ldpc96_cfg'] }
+
+_ft8 = None
+
+def _get_ft8():
+    global _ft8
+    if _ft8 == None:
+        from ft8_coding import FT8_CODING
+        _ft8 = FT8_CODING()
+    return _ft8
+
+# ---------------------------------------------------------------------------
+
+def frame_bits(ecc, length):
+    # returns (payload bits, transmitted bits) for a requested length
+    if ecc == 'ft8':
+        return 77, 174
+    if ecc == 'golay24':
+        length = 12 * ((length + 11) // 12)
+        return length, 2 * length
+    if ecc == 'hamming84':
+        length = 4 * ((length + 3) // 4)
+        return length, 2 * length
+    if ecc == 'ldpc96':
+        return 50, 96
+    return length, length
+
+def encode(ecc, data):
+    # returns the list of transmitted bits for a payload
+    if ecc == 'ft8':
+        ft8 = _get_ft8()
+        data = list(data) + ft8.crc14(data)
+        return [ int(x) for x in ft8.ldpc_encode(data) ]
+    if ecc == 'golay24':
+        from golay24 import golay_encode
+        return sum([ golay_encode(list(data[12*i:12*i+12]))
+                     for i in range(len(data)//12) ], [])
+    if ecc == 'hamming84':
+        from hamming84 import h84_encode
+        return sum([ h84_encode(list(data[4*i:4*i+4]))
+                     for i in range(len(data)//4) ], [])
+    if ecc == 'ldpc96':
+        import ldpc96
+        return ldpc96.l96_encode(data)
+    return list(data)
+
+def decode(ecc, soft):
+    # returns (ok, payload bits) where ok tells whether the FEC scheme
+    # found a valid codeword (always True without FEC)
+    return decode_many(ecc, [soft])[0]
+
+def decode_many(ecc, softs):
+    # decodes several frames (rows of softs), ldpc96 in one batch.
+    # Returns a list of (ok, payload bits)
+    softs = np.asarray(softs, dtype=float)
+    if ecc == 'ldpc96':
+        import ldpc96
+        # a valid frame converges within a few iterations
+        _, post = ldpc96.decode_post(ldpc96.LDPC_H, softs.T, 0, maxiter=50)
+        res = []
+        for soft, p in zip(softs, post.reshape(96, -1).T):
+            cw = [ 1 if x > 0 else 0 for x in p ]
+            # BP also converges on noise now and then, to a codeword
+            # far from what was received
+            dist = sum([ (x > 0) != b for x,b in zip(soft, cw) ])
+            ok = ldpc96._incode(ldpc96.LDPC_H, np.array(cw)) and dist <= 12
+            res.append((bool(ok), ldpc96.l96_data_from_code(cw)))
+        return res
+    return [ _decode(ecc, soft) for soft in softs ]
+
+def _decode(ecc, soft):
+    hard = [ 1 if x > 0 else 0 for x in soft ]
+    if ecc == 'ft8':
+        ft8 = _get_ft8()
+        nok, cw = ft8.ldpc_decode(-soft, 100) # ft8: positive means '0'
+        ok = nok == 91 and ft8.check_crc14(cw[:91])
+        return ok, [ int(x) for x in cw[:77] ]
+    if ecc == 'golay24':
+        from golay24 import golay_encode, golay_decode
+        ok, data = True, []
+        for i in range(len(hard)//24):
+            d = golay_decode(hard[24*i:24*i+24])
+            # more than 3 flipped bits are not correctable
+            dist = sum([ a != b for a,b in zip(golay_encode(d),
+                                               hard[24*i:24*i+24]) ])
+            ok = ok and dist <= 3
+            data += d
+        return ok, data
+    if ecc == 'hamming84':
+        from hamming84 import h84_decode
+        ok, data = True, []
+        for i in range(len(hard)//8):
+            k, d = h84_decode(hard[8*i:8*i+8])
+            ok = ok and k
+            data += d
+        return ok, data
+    return True, hard
+
+def soft_distance(ecc, soft, data):
+    # sum of |soft| over the bits that disagree with the re-encoded
+    # payload: small for the right frame alignment
+    cw = encode(ecc, data)
+    return float(sum([ abs(x) for x,b in zip(soft, cw) if (x > 0) != b ]))
+
+# eof
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+# nckio.py
+# audio input for long recordings: memory-mapped WAV and raw PCM files,
+# read in overlapping chunks by a background thread. And audio output
+# written block by block
+
+# SW released under the MIT license
+
+import numpy as np
+import queue
+import scipy.io.wavfile
+import sys
+import threading
+import wave
+
+# ---------------------------------------------------------------------------
+
+def open_audio(fname, fs=None, raw=False, channel=0):
+    # returns (fs, samples) where samples is a memory-mapped 1-D array:
+    # nothing is read from the file until samples are accessed.
+    # Raw files are mono little-endian int16 at the given fs
+    if raw:
+        assert fs != None, "raw PCM needs a sampling frequency"
+        return fs, np.memmap(fname, dtype='<i2', mode='r')
+    fs, samples = scipy.io.wavfile.read(fname, mmap=True)
+    if samples.ndim > 1:
+        samples = samples[:, channel]
+    return fs, samples
+
+def to_float(samples, dtype=float):
+    # converts a slice of PCM samples to float in [-1..1], of dtype
+    # (float or np.float32)
+    x = samples.astype(dtype)
+    if samples.dtype == np.int16:
+        x /= 32768
+    elif samples.dtype == np.int32:
+        x /= 2147483648
+    elif samples.dtype == np.uint8:
+        x -= 128
+        x /= 128
+    return x
+
+def chunks(samples, hop, margin, dtype=float):
+    # yields (start, chunk) where chunk covers samples[start-margin :
+    # start+hop+margin], clipped to the recording, as float array
+    for start in range(0, len(samples), hop):
+        a = max(0, start - margin)
+        b = min(len(samples), start + hop + margin)
+        yield start, to_float(samples[a:b], dtype)
+
+class READAHEAD:
+
+    # iterates over chunks() while a background thread reads ahead,
+    # at most 'depth' chunks are held in memory
+
+    def __init__(self, samples, hop, margin, depth=2, dtype=float):
+        self.q = queue.Queue(maxsize=depth)
+        self.err = None
+        self.t = threading.Thread(target=self._reader,
+                                  args=(samples, hop, margin, dtype),
+                                  daemon=True)
+        self.t.start()
+
+    def _reader(self, samples, hop, margin, dtype):
+        try:
+            for c in chunks(samples, hop, margin, dtype):
+                self.q.put(c)
+        except Exception as e:
+            self.err = e
+        finally:
+            self.q.put(None)
+
+    def __iter__(self):
+        while True:
+            c = self.q.get()
+            if c == None:
+                if self.err != None:
+                    raise self.err
+                return
+            yield c
+
+    pass
+
+# ---------------------------------------------------------------------------
+
+class AUDIOWRITER:
+
+    # writes float blocks as mono int16 PCM, block by block. The WAV
+    # header is updated with every block, the file is valid while it
+    # grows. Raw PCM can also go to stdout ('-')
+
+    def __init__(self, fname, fs, raw=False, scale=0.5):
+        # scale: factor applied before conversion, full scale is 1.0.
+        # Without a global maximum to normalize by, leave some headroom
+        self.scale = scale
+        self.samples = 0
+        self.clipped = 0
+        if raw:
+            self.wav = None
+            self.f = sys.stdout.buffer if fname == '-' else open(fname, 'wb')
+        else:
+            self.wav = wave.open(fname, 'wb')
+            self.wav.setnchannels(1)
+            self.wav.setsampwidth(2)
+            self.wav.setframerate(int(fs))
+
+    def write(self, block):
+        x = np.round(np.asarray(block) * self.scale * 32767)
+        self.clipped += int(np.sum(np.abs(x) > 32767))
+        data = np.clip(x, -32767, 32767).astype('<i2').tobytes()
+        if self.wav != None:
+            self.wav.writeframes(data) # also patches the header
+        else:
+            self.f.write(data)
+            self.f.flush()
+        self.samples += len(x)
+
+    def close(self):
+        if self.wav != None:
+            self.wav.close()
+        elif self.f != sys.stdout.buffer:
+            self.f.close()
+
+    pass
+
+# eof
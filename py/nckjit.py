@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+# nckjit.py
+# optional JIT compilation of the loop-bound kernels, with Numba
+
+# SW released under the MIT license
+
+# Numba is not required. When it is installed, jit() compiles a kernel
+# (nopython, cached on disk, releasing the GIL), and the modules call
+# the compiled loops: the lag1 autocorrelation (ncklib.lag1), the LDPC
+# belief propagation of ldpc96 and of FT8_CODING. Otherwise they call
+# their vectorized NumPy versions. BACKEND tells which one is in use,
+# NCK_JIT=0 in the environment selects NumPy even with Numba installed.
+# Numba itself is imported, and a kernel compiled (or loaded from the
+# cache), at the kernel's first call, not when the modules are imported.
+#
+# % ./nckjit.py           # benchmark table, both backends
+# % NCK_JIT=0 ./nck-decode.py -e ldpc96 capture.wav
+
+import functools
+import importlib.util
+import os
+
+if os.environ.get('NCK_JIT', '1') == '0' or \
+   importlib.util.find_spec('numba') == None:
+    BACKEND = 'numpy'
+else:
+    BACKEND = 'numba'
+
+def jit(fn):
+    # fn compiled at its first call, or fn as it is (plain Python
+    # loops, a reference)
+    if BACKEND == 'numpy':
+        return fn
+    compiled = None
+    @functools.wraps(fn)
+    def call(*args):
+        nonlocal compiled
+        if compiled == None:
+            import numba
+            compiled = numba.njit(cache=True, nogil=True)(fn)
+        return compiled(*args)
+    return call
+
+# ---------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    import numpy as np
+    import time
+
+    import ft8_coding
+    import ldpc96
+    import ncklib
+
+    def best(fn, n=3):
+        # fastest of n runs, in ms
+        t = []
+        for _ in range(n):
+            t0 = time.perf_counter()
+            fn()
+            t.append(time.perf_counter() - t0)
+        return 1000 * min(t)
+
+    rng = np.random.default_rng(1)
+    x = rng.standard_normal(60 * 1000) # one minute at BW=500
+    w = 50
+    soft = rng.normal(4, 4, (96, 16)) * np.where(
+               ldpc96.LDPC_G.dot(rng.integers(0, 2, 50)) % 2, -1, 1)[:, None]
+    ft8 = ft8_coding.FT8_CODING()
+    a91 = rng.integers(0, 2, 91)
+    llr = rng.normal(3, 2.5, 174) * np.where(ft8.ldpc_encode(a91), -1, 1)
+
+    H = ldpc96.LDPC_H
+    bh, bv, nh, nv = ldpc96._bitsandnodes(H)
+    def logbp(solver):
+        Lc = 2 * soft
+        Lq = np.zeros((H.shape[0], H.shape[1], soft.shape[1]))
+        Lr = np.zeros_like(Lq)
+        for n_iter in range(50):
+            solver(bh, bv, nh, nv, Lc, Lq, Lr, n_iter)
+
+    def lag1_loop():
+        lag = ncklib.LAG1AUTOCORR(w)
+        for v in x:
+            lag.next(v)
+
+    rows = [ # kernel, (Python/NumPy version, compiled version)
+        ('lag1, 60000 samples, w=50',
+         ('LAG1AUTOCORR', lag1_loop),
+         ('numpy', lambda: ncklib._lag1_numpy(x, w, np.empty(len(x)))),
+         ('numba', lambda: ncklib._lag1_loop(x, w, np.empty(len(x))))),
+        ('ldpc96 log-BP, 16 frames, 50 iter',
+         ('numpy', lambda: logbp(ldpc96._logbp_numpy)),
+         ('numba', lambda: logbp(ldpc96._logbp_numba))),
+        ('FT8 LDPC, 1 frame, 20 iter',
+         ('numpy', lambda: ft8._ldpc_decode_numpy(llr, 20)),
+         ('numba', lambda: ft8_coding._bp174(llr, ft8.nmx, ft8.mnx, 20))),
+    ]
+    print(f"backend in use: {BACKEND}" + \
+          ("" if BACKEND == 'numba' else
+           " (Numba not installed, or NCK_JIT=0)"))
+    print(f"{'kernel':36s} {'version':14s} {'ms':>9s}")
+    for name, *versions in rows:
+        for label, fn in versions:
+            if label == 'numba' and BACKEND == 'numpy':
+                continue
+            if label == 'numba':
+                fn() # compile, or load from the cache
+            print(f"{name:36s} {label:14s} " + \
+                  f"{best(fn, 1 if label == 'LAG1AUTOCORR' else 3):9.2f}")
+            name = ''
+
+# eof
@@ -6,64 +6,258 @@
 # (C) Dec 2025 - Jan 2026 <christian.tschudin@unibas.ch> HB9HUH/K6CFT
 # SW released under the MIT license
 
+from fractions import Fraction
+import nckjit
+import ncktables
 import numpy as np
 import scipy.signal as signal
 
 # ---------------------------------------------------------------------------
-# fast non-class-based implementation of the lag1 autocorrelation computation
-# note: this is not thread-safe because of global variables
+# fast implementation of the lag1 autocorrelation computation, over a
+# sliding window of n values. The state is in the object, not in globals:
+# every demodulation has its own, they can run in parallel threads
+
+class LAG1AUTOCORR:
+
+    def __init__(self, n):
+        self.N = n
+        self.old_x     = [0] * n
+        self.x_min_avg = [0] * n
+        self.old_avg   = 0
+        self.old_x_sum = 0
+
+    def next(self, v): # runs in 20% of the time of the naive impl.
+        self.old_x_sum += v - self.old_x[0]
+        avg = self.old_x_sum / self.N
+
+        self.old_x = self.old_x[1:] + [v]
+        x_min_avg = self.x_min_avg[1:] + [v - self.old_avg]
+
+        d = avg - self.old_avg
+        self.old_avg = avg
+
+        s2 = 0.
+        for t in range(len(x_min_avg)):
+            v = x_min_avg[t] - d
+            x_min_avg[t] = v
+            s2 += v * v
+
+        s1 = 0.
+        for t in range(len(x_min_avg)-1):
+            s1 += x_min_avg[t] * x_min_avg[t+1]
+
+        self.x_min_avg = x_min_avg
+        if s2 == 0: # constant window (e.g. the padding), no hue
+            return 0.
+        return s1 / s2
+
+    def next_naive(self, v): # close to the r1 formula, but slow
+        self.old_x = self.old_x[1:] + [v]
+        avg = np.mean(self.old_x)
+        s1 = 0.
+        for t in range(self.N-1):
+            s1 += (self.old_x[t] - avg) * (self.old_x[t+1] - avg)
+        s2 = 0.
+        for t in range(self.N):
+            s2 += np.pow((self.old_x[t] - avg), 2)
+        return s1 / s2
 
-def lag1autocorr_init(n):
-    global old_x, old_avg, old_x_sum, x_min_avg, r1_N
-
-    r1_N = n
-    old_x     = [0] * r1_N
-    x_min_avg = [0] * r1_N
-    old_avg   = 0
-    old_x_sum = 0
-
-def lag1autocorr(v): # runs in 20% of the time of the naive impl.
-    global old_x, old_avg, old_x_sum, x_min_avg, r1_N
-
-    old_x_sum += v - old_x[0]
-    avg = old_x_sum / r1_N
+    pass
 
-    old_x = old_x[1:] + [v]
-    x_min_avg = x_min_avg[1:] + [v - old_avg]
+# The same r1, for a whole signal at once: lag1(x, w)[i] is
+# LAG1AUTOCORR(w).next() after x[i] (the window starts out zeroed).
+# With a window of n values x_t, their sum S, the sum of squares Q, of
+# neighbour products P, and a = S/n:
+#
+#   s2 = Q - S*a
+#   s1 = P - a*(2*S - x_first - x_last) + (n-1)*a*a
+
+def lag1(x, w, out=None, ws=None):
+    # r1 of float64 x, over a sliding window of w values. out: optional
+    # float64 array of len(x) for the result, ws: optional WORKSPACE
+    # for the temporaries
+    if ws != None and np.asarray(x).dtype != np.float64:
+        x = _copy(ws.buffer('lag1.in', len(x), np.float64), x)
+    else:
+        x = np.asarray(x, dtype=np.float64)
+    if out is None:
+        out = np.empty(len(x))
+    if nckjit.BACKEND == 'numba':
+        return _lag1_loop(x, w, out)
+    return _lag1_numpy(x, w, out, ws)
+
+def _copy(dst, src):
+    np.copyto(dst, src, casting='unsafe')
+    return dst
+
+def _lag1_numpy(x, w, out, ws=None):
+    # the sums are differences of prefix sums (as nckfixed.lag1), all
+    # computed in place, in six buffers of about len(x)
+    n = len(x)
+    def buf(name, m):
+        return np.empty(m) if ws == None else \
+               ws.buffer('lag1.' + name, m, np.float64)
+    xp = buf('x', n + w) # x after w zeros
+    xp[:w] = 0.
+    xp[w:] = x
+    c = buf('c', n + w + 1) # prefix sums, c[0] = 0
+    c[0] = 0.
+    t = buf('t', n + w)
+    S, Q, P, a = [ buf(k, n) for k in 'SQPa' ]
+    np.cumsum(xp, out=c[1:])
+    np.subtract(c[w+1:], c[1:n+1], out=S)
+    np.multiply(xp, xp, out=t)
+    np.cumsum(t, out=c[1:])
+    np.subtract(c[w+1:], c[1:n+1], out=Q)
+    np.multiply(xp[1:], xp[:-1], out=t[:-1]) # the w-1 pairs in the window
+    np.cumsum(t[:-1], out=c[1:n+w])
+    np.subtract(c[w:n+w], c[1:n+1], out=P)
+    np.divide(S, w, out=a)
+    # s2 = Q - S*a, into Q
+    np.multiply(S, a, out=t[:n])
+    Q -= t[:n]
+    # s1 = P - a*(2*S - x_first - x_last) + (w-1)*a*a, into P
+    np.multiply(a, w - 1, out=t[:n])
+    t[:n] *= a
+    S *= 2
+    S -= xp[1:n+1]
+    S -= xp[w:]
+    S *= a
+    P -= S
+    P += t[:n]
+    # s1/s2 where s2 > 0, else 0
+    pos = np.greater(Q, 0, out=t[:n].view(bool)[:n])
+    np.divide(P, Q, out=out, where=pos)
+    np.logical_not(pos, out=pos)
+    np.copyto(out, 0., where=pos)
+    return out
+
+@nckjit.jit
+def _lag1_loop(x, w, r1):
+    # running sums, one update per sample, into r1
+    S = Q = P = 0.
+    for i in range(len(x)):
+        v = x[i]
+        u = x[i-w] if i >= w else 0.    # leaves the window
+        f = x[i-w+1] if i >= w-1 else 0. # first in the window, after
+        p = x[i-1] if i >= 1 else 0.
+        S += v - u
+        Q += v * v - u * u
+        if w > 1:
+            P += v * p - u * f
+        a = S / w
+        s2 = Q - S * a
+        s1 = P - a * (2 * S - f - v) + (w - 1) * a * a
+        r1[i] = s1 / s2 if s2 > 0 else 0.
+    return r1
 
-    d = avg - old_avg
-    old_avg = avg
+# ---------------------------------------------------------------------------
 
-    s2 = 0.
-    for t in range(len(x_min_avg)):
-        v = x_min_avg[t] - d
-        x_min_avg[t] = v
-        s2 += v * v
+def hue_mix(hue):
+    # weights (a, b) of the low and high pass parts for a hue, a*a+b*b=1:
+    # the power spectrum moves linearly from reddish to blueish
+    f = abs(NCK.BLUEISH - hue) / 2
+    return np.sqrt(f), np.sqrt(1 - f)
+
+def hue_filter(wn, hue, USE_FFT=False, mix=None):
+    # shapes white noise wn to a hue in [-1..+1] (see NCK._noise).
+    # mix: hue_mix(hue), if precomputed
+
+    if hue == NCK.WHITE:
+        return wn
+    a, b = hue_mix(hue) if mix is None else mix
+
+    if USE_FFT:
+        fd = np.fft.fft(wn)
+        ph = np.pi * np.arange(len(fd)) / len(fd)
+        if hue == NCK.REDDISH:
+            fd *= np.abs(np.cos(ph))
+        elif hue == NCK.BLUEISH:
+            fd *= np.sin(ph)
+        else:
+            fd *= np.sqrt((a * np.cos(ph))**2 + (b * np.sin(ph))**2)
+        return np.fft.ifft(fd).real.astype(wn.dtype, copy=False)
 
-    s1 = 0.
-    for t in range(len(x_min_avg)-1):
-        s1 += x_min_avg[t] * x_min_avg[t+1]
+    rn = wn[:-1] + wn[1:] # our low pass filter
+    bn = wn[:-1] - wn[1:] # our high pass filter
+    if hue == NCK.REDDISH:
+        return rn
+    if hue == NCK.BLUEISH:
+        return bn
+    return a * rn + b * bn # flat power spectr
 
-    return s1 / s2
+# ---------------------------------------------------------------------------
 
-def lag1autocorr_naive(v): # close to the r1 formula, but slow
-    global old_x, r1_N
+class CONSTELLATION:
+
+    # M-ary layer of NCK, for any M >= 2. Level k is noise of hue
+    # -1 + 2k/(M-1) (reddish to blueish, at baseband), its lag1
+    # autocorrelation is -hue/2. Symbols are numbered by the r1 the
+    # receiver measures, in the order of the on-air format: for M=2
+    # symbol 0 has the highest r1, for M > 2 the lowest (sign). At
+    # CF != 0 this sends M > 2 symbols as levels 0..M-1 at baseband
+    # (NCK._symbol() flips the levels where mixing needs it).
+    #
+    # Bits are sent in groups of k bits as n symbols, with the n <= 4
+    # that carries the most bits per symbol: M=2, 4, 8 .. send log2(M)
+    # bits per symbol, M=3 sends 3 bits as 2 symbols (8 of 9 values).
+
+    def __init__(self, M, nmax=4):
+        assert M >= 2, "at least two levels"
+        self.M = M
+        self.hues = np.linspace(NCK.REDDISH, NCK.BLUEISH, M).tolist()
+        self.mix = [ hue_mix(h) for h in self.hues ]
+        self.sign = 1 if M == 2 else -1
+        # expected r1, up to a gain
+        self.r1 = self.sign * (0.5 - np.arange(M) / (M - 1))
+        # on -sign*r1, ascending
+        self.thresholds = -self.sign * (self.r1[:-1] + self.r1[1:]) / 2
+        self.mean_abs = np.mean(np.abs(self.r1))
+        self.n, self.k = max(((n, (M**n).bit_length() - 1)
+                              for n in range(1, nmax + 1)),
+                             key=lambda nk: (nk[1] / nk[0], -nk[0]))
+        self.bitw = 1 << np.arange(self.k - 1, -1, -1)   # MSB first
+        self.symw = M ** np.arange(self.n - 1, -1, -1)
+
+    def bits_to_symbols(self, bits):
+        # returns (symlst, padding), padding is the number of zero bits
+        # appended to fill the last group
+        pad = -len(bits) % self.k
+        b = np.concatenate((np.asarray(bits, dtype=np.int64),
+                            np.zeros(pad, dtype=np.int64)))
+        v = b.reshape(-1, self.k) @ self.bitw
+        return (v[:, None] // self.symw % self.M).ravel().tolist(), pad
+
+    def symbols_to_bits(self, msg):
+        # inverse of bits_to_symbols(), including the padding bits. A
+        # group whose value does not fit in k bits gives all ones
+        m = np.asarray(msg, dtype=np.int64)[:len(msg) // self.n * self.n]
+        v = np.minimum(m.reshape(-1, self.n) @ self.symw, (1 << self.k) - 1)
+        return (v[:, None] // self.bitw % 2).ravel().tolist()
+
+    def slice(self, values):
+        # symbols for the r1 values at the sampling instants. The gain
+        # (signal to noise ratio, filters) is estimated from their mean
+        # magnitude, the thresholds scale with it
+        v = np.asarray(values, dtype=np.float64)
+        if self.M > 2 and len(v) > 0:
+            v = v / max(np.mean(np.abs(v)) / self.mean_abs, 1e-12)
+        return np.digitize(-self.sign * v, self.thresholds,
+                           right=True).tolist()
 
-    old_x = old_x[1:] + [v]
-    avg = np.mean(old_x)
-    s1 = 0.
-    for t in range(r1_N-1):
-        s1 += (old_x[t] - avg) * (old_x[t+1] - avg)
-    s2 = 0.
-    for t in range(r1_N):
-        s2 += np.pow((old_x[t] - avg), 2)
-    return s1 / s2
+    pass
 
 # ---------------------------------------------------------------------------
 
 class INTERLEAVE:
 
-    def __init__(self, N): # mostly copied from WSPR
+    def __init__(self, N): # the permutations are cached on disk
+        t = ncktables.load('interleave', N, lambda: self._tables(N))
+        self.m = t['m'].tolist()
+        self.rm = t['rm'].tolist()
+
+    @staticmethod
+    def _tables(N): # mostly copied from WSPR
         map = [None] * N
         unmap = [None] * N
         P = 0
@@ -79,8 +273,7 @@ class INTERLEAVE:
                     assert unmap[J] == None
                     unmap[J] = P
                     P += 1
-        self.m = map
-        self.rm = unmap
+        return { 'm': map, 'rm': unmap }
 
     def map(self, lst):
         return [ lst[self.m[i]] for i in range(len(lst)) ]
@@ -92,90 +285,356 @@ class INTERLEAVE:
 
 # ---------------------------------------------------------------------------
 
+class UPCONVERTER:
+
+    # Streaming counterpart of the resampling and mixing in NCK.modulate():
+    # takes the baseband signal (0..BW at 2*BW samples per sec) in pieces
+    # of any length and returns it at FS, moved to CF and spectrally
+    # inverted like modulate()'s output (not moved if CF=0). The state is
+    # carried across pieces, the output does not depend on the split.
+    #
+    # For CF != 0, the band is first shifted to -BW/2..BW/2 (complex),
+    # then a polyphase FIR interpolates it to FS and removes the other
+    # half, and mixing with CF takes it to CF-BW/2..CF+BW/2. The FIR's
+    # transition band is about 7*BW/taps wide, at the band edges.
+
+    def __init__(self, FS, CF, BW, taps=96):
+        r = (Fraction(FS) / Fraction(2 * BW)).limit_denominator(1000)
+        self.L, self.M = r.numerator, r.denominator # FS/(2*BW) = L/M
+        self.FS, self.CF, self.BW = FS, CF, BW
+        self.T = taps # per polyphase branch
+        h = signal.firwin(taps * self.L, BW if CF == 0 else BW/2,
+                          window=('kaiser', 6), fs=2*BW*self.L) * self.L
+        self.hp = np.reshape(h, (taps, self.L)) # hp[t,p] = h[t*L + p]
+        self.D = (taps * self.L - 1) // 2 # group delay, at L*2*BW
+        self.x = np.zeros(taps, dtype=float if CF == 0 else complex)
+        self.x0 = -taps # input index of self.x[0]
+        self.nin = 0
+        self.nout = 0
+
+    def _run(self, nmax=None):
+        # computes the outputs whose inputs are all in
+        n1 = ((self.x0 + len(self.x)) * self.L - 1 - self.D) // self.M + 1
+        if nmax != None:
+            n1 = min(n1, nmax)
+        n = np.arange(self.nout, max(n1, self.nout))
+        u = n * self.M + self.D
+        base, ph = u // self.L, u % self.L
+        idx = base[:,None] - np.arange(self.T)[None,:] - self.x0
+        y = np.sum(self.x[idx] * self.hp[:,ph].T, axis=1)
+        self.nout += len(n)
+        # forget inputs no longer needed
+        drop = (self.nout * self.M + self.D) // self.L - self.T + 1 - self.x0
+        if drop > 0:
+            self.x = self.x[drop:]
+            self.x0 += drop
+        if self.CF == 0:
+            return y
+        ph = 2 * np.pi * ((n * (self.CF / self.FS)) % 1)
+        return 2 * np.real(np.conj(y) * np.exp(1j * ph))
+
+    def process(self, x):
+        # returns the output samples that x completes
+        if self.CF != 0: # shift by -BW/2, i.e. by -1/4 of the sample rate
+            x = x * np.array([1, -1j, -1, 1j])[(self.nin +
+                                                 np.arange(len(x))) % 4]
+        self.x = np.concatenate((self.x, x))
+        self.nin += len(x)
+        return self._run()
+
+    def flush(self):
+        # returns the remaining output samples, up to the length that
+        # modulate() would produce for the same input
+        self.x = np.concatenate((self.x, np.zeros(self.D // self.L + 2)))
+        return self._run(int(self.FS * self.nin / (2 * self.BW)))
+
+    pass
+
+# ---------------------------------------------------------------------------
+
+class DOWNCONVERTER:
+
+    # Front end of NCK.demodulate(): takes the signal at FS and returns
+    # its band CF-BW/2..CF+BW/2 as a real signal at 2*BW samples per sec,
+    # 0..BW, not inverted (CF=0: the band 0..BW).
+    #
+    # A complex mixer moves the band's center to 0 Hz (no image terms),
+    # halfband FIRs decimate by 2 while the rate stays at 6*BW or more,
+    # and a polyphase FIR takes it to 2*BW. These only keep aliases out
+    # of +-0.6*BW, their transition bands are wide and their filters
+    # short: a few multiplications per input sample, and each stage runs
+    # at half the rate of the one before. The cut at +-BW/2 is made at
+    # 2*BW. Output sample k is aligned with input sample k*FS/(2*BW).
+
+    def __init__(self, FS, CF, BW, dtype=np.float64, atten=60):
+        self.FS, self.BW = FS, BW
+        self.dtype = np.dtype(dtype)
+        self.f0 = CF if CF != 0 else BW / 2 # center of the band
+        # the filters and the mixer table are cached on disk
+        t = ncktables.load('downconverter',
+                           [FS, CF, BW, self.dtype.str, atten],
+                           lambda: self._design(FS, BW, self.f0,
+                                                self.dtype, atten))
+        self.lo = t.get('lo')
+        self.stages = [ t[f's{i}'] for i in range(int(t['n'])) ]
+        self.up, self.down = int(t['up']), int(t['down'])
+        self.h, self.hb = t['h'], t['hb']
+
+    @staticmethod
+    def _design(FS, BW, f0, dtype, atten):
+        def fir(n, cutoff, fs, beta):
+            return signal.firwin(n, cutoff, fs=fs,
+                                 window=('kaiser', beta)).astype(dtype)
+        t = {}
+        q = Fraction(f0) / Fraction(FS)
+        if q.denominator <= 1 << 16: # mixer from a table of one period
+            k = np.arange(q.denominator) * q.numerator % q.denominator
+            t['lo'] = np.exp(-2j * np.pi * k / q.denominator).astype(
+                          np.result_type(dtype, 1j))
+        p = 0.6 * BW # to be kept free of aliases: the band, with margin
+        n = 0 # halfband FIRs
+        r = FS
+        while r / 2 >= 3 * BW:
+            m, beta = signal.kaiserord(atten, (r/2 - 2*p) / (r/2))
+            m += 3 - m % 4 # 4k+3 taps: zero odd taps, nonzero ends
+            t[f's{n}'] = fir(m, r/4, r, beta)
+            n += 1
+            r /= 2
+        t['n'] = n
+        q = (Fraction(2 * BW) / Fraction(r)).limit_denominator(1000)
+        t['up'], t['down'] = q.numerator, q.denominator
+        ru = r * q.numerator
+        m, beta = signal.kaiserord(atten, (2*BW - 2*p) / (ru/2))
+        t['h'] = fir(m | 1, BW, ru, beta) * q.numerator
+        m, beta = signal.kaiserord(atten, 0.2 * BW / BW)
+        t['hb'] = fir(m | 1, BW / 2, 2 * BW, beta)
+        return t
+
+    def period(self):
+        # input samples at FS after which the mixer, the decimation
+        # phases and the final shift repeat: pieces of a signal starting
+        # at multiples of it give the samples of one pass over it
+        k = len(self.stages)
+        n = (1 << k) * self.down * (4 // np.gcd(self.up, 4))
+        return int(np.lcm(n, 1 if self.lo is None else len(self.lo)))
+
+    def settle(self):
+        # samples at FS until the filters have settled, at either end of
+        # the input: half of each FIR's length
+        n, r = 0, self.FS
+        for h in self.stages:
+            n += len(h) // 2 * self.FS / r
+            r /= 2
+        n += len(self.h) // 2 * self.FS / (r * self.up)
+        n += len(self.hb) // 2 * self.FS / (2 * self.BW)
+        return int(np.ceil(n))
+
+    def outlen(self, n):
+        # length of process()'s output for n input samples
+        return int(2 * self.BW * n / self.FS)
+
+    def process(self, x, out=None, ws=None):
+        # x: real samples at FS, not modified. out: optional array of
+        # outlen(len(x)) for the result, ws: optional WORKSPACE for the
+        # mixer's output (the decimation stages allocate their own)
+        n = len(x)
+        if self.lo is None:
+            ph = (np.arange(n) * (self.f0 / self.FS)) % 1
+            z = x * np.exp(-2j * np.pi * ph.astype(self.dtype, copy=False))
+        else: # one table period per row
+            P = len(self.lo)
+            z = np.empty(n, dtype=self.lo.dtype) if ws == None else \
+                ws.buffer('dc.mix', n, self.lo.dtype)
+            m = n - n % P
+            np.multiply(x[:m].reshape(-1, P), self.lo,
+                        out=z[:m].reshape(-1, P))
+            np.multiply(x[m:], self.lo[:n - m], out=z[m:])
+        for h in self.stages:
+            z = signal.resample_poly(z, 1, 2, window=h)
+        z = signal.resample_poly(z, self.up, self.down, window=self.h)
+        z = np.convolve(z[:self.outlen(n)], self.hb, 'same')
+        # shift by +BW/2, 1/4 of the rate: the band becomes 0..BW. The
+        # real part of z * (1, j, -1, -j), taken without a product. Plain
+        # slice assignments: NumPy 2.2+ gets np.negative() wrong with a
+        # strided .real/.imag input and a strided out=
+        if out is None:
+            out = np.empty(len(z), dtype=z.real.dtype)
+        out[0::4] = z.real[0::4]
+        out[1::4] = -z.imag[1::4]
+        out[2::4] = -z.real[2::4]
+        out[3::4] = z.imag[3::4]
+        return out
+
+    pass
+
+# ---------------------------------------------------------------------------
+
+class SYMBOLSYNC:
+
+    # Early-late symbol timing recovery on the r1 trace. |r1| peaks at
+    # the symbol centers (where the smoothed lag1 autocorrelation has
+    # seen one symbol only) and falls towards the next symbol when its
+    # hue differs. At each sampling instant t, |r1| is also taken d
+    # samples before and after: a larger late value means t is early.
+    # The normalized difference drives a proportional-integral loop,
+    # the integral tracks the symbol period, i.e. a clock offset
+    # between transmitter and receiver, and the loop holds it through
+    # runs of equal symbols (which give no timing error). The loop
+    # bandwidth is relative to the symbol rate: it must be small for
+    # noisy r1, and large enough to follow the drift.
+    #
+    # r1 is fed in segments of any length. Instants are fractional, the
+    # values at them interpolated.
+
+    def __init__(self, w, pos=0, bw=0.01, zeta=1.0):
+        # w    nominal samples per symbol (at 2*BW), pos: first instant
+        self.w = w
+        self.d = w / 4
+        self.t = float(pos)    # next sampling instant, stream position
+        self.period = float(w) # tracked symbol period, in samples
+        th = bw / (zeta + 1 / (4 * zeta))
+        self.kp = 4 * zeta * th / (1 + 2 * zeta * th + th * th)
+        self.ki = 4 * th * th / (1 + 2 * zeta * th + th * th)
+        self.buf = np.zeros(0)
+        self.buf_pos = 0
+
+    def _at(self, t):
+        i = t - self.buf_pos
+        i0 = int(np.floor(i))
+        return self.buf[i0] + (i - i0) * (self.buf[i0 + 1] - self.buf[i0])
+
+    def feed(self, r1):
+        # returns (instants, values) of the symbols whose early and late
+        # samples are in the r1 seen so far
+        self.buf = np.concatenate((self.buf, r1))
+        ts, vs = [], []
+        while self.t + self.d + 1 < self.buf_pos + len(self.buf):
+            t = self.t
+            ts.append(t)
+            vs.append(self._at(t))
+            if t - self.d >= self.buf_pos:
+                e, l = abs(self._at(t - self.d)), abs(self._at(t + self.d))
+                err = (l - e) / (l + e) if l + e > 0 else 0
+                self.period += self.ki * err * self.w
+                self.t += self.kp * err * self.w
+            self.t += self.period
+        drop = max(0, int(np.floor(self.t - self.d)) - self.buf_pos)
+        self.buf = self.buf[drop:]
+        self.buf_pos += drop
+        return ts, vs
+
+    def drift(self):
+        # estimated clock offset, in ppm: positive if the symbols are
+        # longer than nominal
+        return (self.period / self.w - 1) * 1e6
+
+    pass
+
+# ---------------------------------------------------------------------------
+
+class WORKSPACE:
+
+    # Reusable buffers for NCK.demodulate(), lag1() and
+    # DOWNCONVERTER.process(): repeated calls for signals of the same
+    # length allocate no new large arrays (scipy's decimation and the
+    # smoothing filter still allocate their own). A buffer grows to the
+    # longest length asked for. Arrays a call returns can be views into
+    # the workspace, valid until its next call: copy them (or pass out=)
+    # to keep them. One workspace per thread.
+
+    def __init__(self):
+        self.bufs = {}
+
+    def buffer(self, name, n, dtype):
+        # n elements of dtype, contents undefined
+        dtype = np.dtype(dtype)
+        b = self.bufs.get(name)
+        if b is None or b.dtype != dtype or len(b) < n:
+            b = np.empty(n, dtype=dtype)
+            self.bufs[name] = b
+        return b[:n]
+
+    def nbytes(self):
+        return sum([ b.nbytes for b in self.bufs.values() ])
+
+    pass
+
+# ---------------------------------------------------------------------------
+
 class NCK:
 
     REDDISH = -1
     WHITE   =  0
     BLUEISH = +1
 
-    def __init__(self, FS=12000, CF=1500, BW=1000, KR=75, M=2, USE_FFT=False):
+    def __init__(self, FS=12000, CF=1500, BW=1000, KR=75, M=2, USE_FFT=False,
+                 bank=None, rng=None, dtype=np.float64):
         self.FS  = FS  # sampling freq, in Hz
         self.CF  = CF  # center freq, in Hz
         self.BW  = BW  # bandwidth, in Hz
         self.KR  = KR  # keying rate, in Baud
         self.M   = M   # number of levels per symbol
+        self.constellation = CONSTELLATION(M)
         self.USE_FFT = USE_FFT
+        self.bank = bank # optional ncknoise.NOISEBANK
+        self.rng  = rng  # optional np.random.Generator, else np.random
+        # sample type of all signal buffers: np.float32 halves their
+        # memory traffic. Phases and the lag1 sums stay in float64
+        self.dtype = np.dtype(dtype)
 
-    def _noise(self, hue):
+    def _noise(self, hue, mix=None):
         # generate "two symbols worth" of samples of "noise with a hue"
         #   where hue is a float in the interval [-1..+1]: -1 stands
         #   for 'reddish', 0 for 'white', and +1 for 'blueish'
+        #   (mix: hue_mix(hue), if precomputed)
+
+        if self.bank != None:
+            return self.bank.draw(hue, self.rng, dtype=self.dtype)
 
         SPS2 = int(2 * 2 * self.BW / self.KR) # samples per symbol, doubled
-        wn = 2 * np.random.rand(SPS2) - 1
+        if self.rng == None:
+            wn = np.random.rand(SPS2).astype(self.dtype, copy=False)
+        else:
+            wn = self.rng.random(SPS2, dtype=self.dtype)
+        wn *= 2
+        wn -= 1
 
         if hue == self.WHITE:
             return wn
-
-        if self.USE_FFT:
-            fd = np.fft.fft(wn)
-            if hue == self.REDDISH:
-                for i in range(len(fd)):
-                    fd[i] *= np.abs(np.cos(np.pi * i / len(fd)))
-            elif hue == self.BLUEISH:
-                for i in range(len(fd)):
-                    fd[i] *= np.sin(np.pi * i / len(fd))
-            else:
-                assert False
-            n = np.fft.ifft(fd).real
-        else:
-            def lpf(v): # our low pass filter
-                return np.array([ v[i] + v[i+1] for i in range(len(v)-1) ])
-
-            def hpf(v): # our high pass filter
-                return np.array([ v[i] - v[i+1] for i in range(len(v)-1) ])
-
-            if hue == self.REDDISH:
-                n = lpf(wn)
-                # n = np.sin(2 * np.pi * SPS2/4/2 * np.arange(SPS2)/SPS2)
-            elif hue == self.BLUEISH:
-                n = hpf(wn)
-                # n = np.sin(2 * np.pi * 3*SPS2/4/2 * np.arange(SPS2)/SPS2)
-            else:
-                rn = lpf(wn)
-                bn = hpf(wn)
-                f = abs(self.BLUEISH - hue) / 2
-                n = np.sqrt(f) * rn + np.sqrt(1 - f) * bn # flat power spectr
+        n = hue_filter(wn, hue, self.USE_FFT, mix)
         return n / np.max(np.abs(n))
 
+    def _ramp(self, up):
+        # raised cosine white noise, for ramping up or down
+        w = int(2 * self.BW / self.KR)  # samples per symbol (when FS=2*BW)
+        sym = self._noise(self.WHITE)[:w]
+        c = np.cos(np.pi * np.arange(w, dtype=self.dtype) / w)
+        return sym * 0.5 * ((1 - c) if up else (c + 1)) / np.sqrt(2)
+
+    def _symbol(self, s):
+        # one symbol's noise, at 2*BW samples per sec
+        w = int(2 * self.BW / self.KR)
+        c = self.constellation
+        # r1 is hue/2 after mixing (it flips the frequency range), -hue/2
+        # at CF=0: the level for symbol s depends on both and c.sign
+        if (self.CF != 0) == (c.sign > 0):
+            s = self.M - 1 - s
+        return self._noise(c.hues[s], c.mix[s])[:w]
+
+    def _cos(self, f, fs, n):
+        # cos(2*pi*f*t) for n samples at rate fs, in self.dtype. The
+        # phase is reduced to one turn in float64 first: float32 time
+        # stamps would lose the carrier's phase after a few seconds
+        ph = (np.arange(n) * (f / fs)) % 1
+        return np.cos(2 * np.pi * ph.astype(self.dtype, copy=False))
+
     def modulate(self, symlst):
         # returns timedomain signal at selected FS, no padding
         # symlst: vector of index values in [0..M-1]
-    
-        w = int(2 * self.BW / self.KR)  # samples per symbol (when FS=2*BW)
-        sym = self._noise(self.WHITE)[:w] # ramp up (raised cosine white noise)
-        sym *= 0.5 * (1 - np.cos(np.pi * np.arange(w)/w)) / np.sqrt(2)
-        sig = sym
-        if self.M == 2:
-            for b in symlst:
-                if self.CF != 0: # mixing will flip the frequenc range
-                    b = 1 - b
-                sym = self._noise([self.REDDISH,self.BLUEISH][b])
-                sig = np.hstack((sig, sym[:w]))
-        elif self.M == 3:
-            for i,t in enumerate(symlst):
-                sym = self._noise([self.REDDISH,0,self.BLUEISH][t])
-                sig = np.hstack((sig, sym[:w]))
-        elif self.M == 4:
-            for i,s in enumerate(symlst):
-                sym = self._noise([self.REDDISH, self.REDDISH/3,
-                                   self.BLUEISH/3, self.BLUEISH][s])
-                sig = np.hstack((sig, sym[:w]))
-        else:
-            assert False
-        sym = self._noise(self.WHITE)[:w] # ramp down (raised cosine white n.)
-        sym *= 0.5 * (np.cos(np.pi * np.arange(w)/w) + 1) / np.sqrt(2)
-        sig = np.hstack((sig, sym))
+
+        sig = np.concatenate([self._ramp(True)] + \
+                             [ self._symbol(s) for s in symlst ] + \
+                             [self._ramp(False)], dtype=self.dtype)
 
         if self.CF != 0:
             if self.CF >= self.BW:
@@ -183,20 +642,17 @@ class NCK:
                 tmp_fs = self.CF + self.BW/2
                 sig = signal.resample(sig, int(len(sig) * tmp_fs / self.BW))
                 # transpose baseband to CF
-                sig *= np.cos(2 * np.pi * tmp_fs * \
-                              (np.arange(len(sig)) / (2*tmp_fs)))
+                sig *= self._cos(tmp_fs, 2*tmp_fs, len(sig))
             else:
                 assert self.CF+3*self.BW/2 <= self.FS//2, \
                        "FS too small for mixing"
                 # move signal up
                 tmp_fs1 = self.FS // 2 - self.BW // 2
                 sig = signal.resample(sig, len(sig) * tmp_fs1 // self.BW)
-                sig *= np.cos(2 * np.pi * tmp_fs1 * \
-                              (np.arange(len(sig)) / (2*tmp_fs1)))
+                sig *= self._cos(tmp_fs1, 2*tmp_fs1, len(sig))
                 # move signal down
                 tmp_fs2 = (tmp_fs1) - (self.CF + self.BW//2)
-                sig *= np.cos(2 * np.pi * tmp_fs2 * \
-                              (np.arange(len(sig)) / (2*tmp_fs1)))
+                sig *= self._cos(tmp_fs2, 2*tmp_fs1, len(sig))
                 tmp_fs3 = self.CF + self.BW//2
                 sig = signal.resample(sig, len(sig) * tmp_fs3 // tmp_fs1)
                 tmp_fs = tmp_fs3
@@ -205,99 +661,218 @@ class NCK:
         # upsample to final FS
         return signal.resample(sig, int(self.FS * len(sig) / (2*tmp_fs)))
 
-    def demodulate(self, rcvd, msgstart=0, msglen=None):
+    def modulate_stream(self, symbol_iter, block=4096):
+        # generator version of modulate(): yields blocks of 'block'
+        # samples at FS (the last one padded with silence) while
+        # consuming symbol_iter, which can be endless. A None symbol
+        # stands for one symbol's worth of silence: runs of symbols are
+        # ramped up and down like in modulate(), so that e.g.
+        #   frame + [None]*20 + frame + [None]*20 + ...
+        # gives a beacon. Memory use does not depend on the length.
+        assert self.CF == 0 or self.CF >= self.BW/2, "CF too small"
+        up = UPCONVERTER(self.FS, self.CF, self.BW)
+        w = int(2 * self.BW / self.KR)
+
+        def baseband():
+            on = False
+            for s in symbol_iter:
+                if s == None:
+                    if on:
+                        yield self._ramp(False)
+                        on = False
+                    yield np.zeros(w, dtype=self.dtype)
+                    continue
+                if not on:
+                    yield self._ramp(True)
+                    on = True
+                yield self._symbol(s)
+            if on:
+                yield self._ramp(False)
+
+        out, n = [], 0
+        for x in baseband():
+            y = up.process(x)
+            out.append(y)
+            n += len(y)
+            if n >= block:
+                out = np.concatenate(out)
+                for i in range(0, n - block + 1, block):
+                    yield out[i:i+block]
+                out = [ out[n - n % block:] ]
+                n = n % block
+        out = np.concatenate(out + [ up.flush() ])
+        for i in range(0, len(out), block):
+            yield np.concatenate((out[i:i+block],
+                                  np.zeros(max(0, i + block - len(out)))))
+
+    def align_step(self):
+        # smallest step (in samples at FS) that maps to an integer sample
+        # index at the 2*BW rate: windows and chunks start at multiples
+        return (Fraction(2 * self.BW).limit_denominator(1000) / \
+                self.FS).denominator
+
+    def _baseband(self, rcvd, msgstart, msglen, window, margin, pad=0,
+                  ws=None):
+        # the normalized baseband signal (0..BW at 2*BW) for demodulate()
+        # and demodulate_symbols(), with msgstart translated to its rate.
+        # pad: samples of 0.01 before and after it. rcvd is not modified
+        if window != None:
+            if margin == None: # three symbols
+                margin = int(3 * self.FS / self.KR)
+            q = self.align_step()
+            start, stop = window
+            a = max(0, start - margin) // q * q
+            b = min(len(rcvd), stop + margin)
+            rcvd = rcvd[a:b]
+            msgstart = start - a
+            msglen = int(2 * self.BW * (stop - start) / self.FS)
+        if ws != None and np.asarray(rcvd).dtype != self.dtype:
+            rcvd = _copy(ws.buffer('in', len(rcvd), self.dtype), rcvd)
+        else:
+            rcvd = np.asarray(rcvd, dtype=self.dtype)
+
+        # mix down and decimate to 2*BW, the band becomes 0..BW
+        dc = DOWNCONVERTER(self.FS, self.CF, self.BW, dtype=self.dtype)
+        n = dc.outlen(len(rcvd))
+        bb = np.empty(n + 2*pad, dtype=self.dtype) if ws == None else \
+             ws.buffer('bb', n + 2*pad, self.dtype)
+        dc.process(rcvd, out=bb[pad:pad+n], ws=ws)
+        x = bb[pad:pad+n]
+        x /= max(np.max(x), -np.min(x)) # max(abs(x)), without a copy
+        bb[:pad] = 0.01
+        bb[pad+n:] = 0.01
+        return bb, int(2 * self.BW * msgstart / self.FS), msglen
+
+    def demodulate(self, rcvd, msgstart=0, msglen=None, window=None,
+                   margin=None, sync=None, ws=None, out=None):
         # returns a 3-tuple: (sig,r1,symlst,samplepos)
         # where sig     extracted baseband signal (time domain)
         #       r1      smoothed lag1 autocorrelate signal
         #       symlst  recovered list of symbols
         #       sp      positions where r1 was sampled
-
-        invert = False
-        if self.CF != 0: # mix down to baseband
-
-            if self.CF >= self.BW:
-                # filter out band of interest (avoid mixing noise where it
-                # does not belong)
-                sos = signal.butter(10, [self.CF - self.BW/2,
-                                        self.CF + self.BW/2], 'pass',
-                                    fs=self.FS,  output='sos')
-                rcvd = signal.sosfiltfilt(sos, rcvd)
-            else:
-                print("warning: no bandpass filtering applied")
-
-            if self.CF >= self.BW:
-                s = np.cos(2 * np.pi * (self.CF-self.BW/2) * \
-                           (np.arange(len(rcvd)) / self.FS))
-                rcvd *= s
-            else:
-                s = np.cos(2 * np.pi * (self.FS/2) * \
-                           (np.arange(len(rcvd)) / self.FS))
-                rcvd *= s
-                s = np.cos(2 * np.pi * (self.FS/2 - (self.CF + self.BW/2)) * \
-                           (np.arange(len(rcvd)) / self.FS))
-                rcvd *= s
-                invert = True
-
-        # apply lowpass filter at BW boundary
-        rcvd = signal.resample(rcvd, int(2*self.BW * len(rcvd) / self.FS))
-        rcvd /= np.max(np.abs(rcvd))
+        # window: optional (start,stop) range of rcvd, in samples at FS.
+        #   Only this range, extended by 'margin' samples on each side for
+        #   the filters to settle, is processed. msgstart and msglen are
+        #   then ignored, and sig and r1 cover the window only, with sp
+        #   relative to the window's start.
+        # sync: optional SYMBOLSYNC, started at msgstart (w=samples per
+        #   symbol, pos=0): r1 is sampled at the instants it tracks
+        #   instead of every w samples, and its drift() is the clock
+        #   offset afterwards.
+        # ws: optional WORKSPACE, for repeated calls. sig is then a view
+        #   into it. out: optional array for r1, of r1's length.
+        # rcvd is never modified.
 
         w = int(2 * self.BW / self.KR) # samples per symbol
-        rcvd = np.hstack( ([0.01]*w, rcvd, [0.01]*w) )
-        lag1autocorr_init(w)
+        rcvd, msgstart, msglen = self._baseband(rcvd, msgstart, msglen,
+                                                window, margin, pad=w,
+                                                ws=ws)
 
-        r1 = [ lag1autocorr(x) for x in rcvd ][2*w:]
+        # the sums run in float64 whatever the dtype
+        r1 = lag1(rcvd, w, ws=ws, out=None if ws == None else
+                  ws.buffer('r1', len(rcvd), np.float64))[2*w:]
         # smooth according to sender's keying rate
-        sos = signal.butter(2, self.KR, 'low',
-                            fs=2*self.BW,  output='sos')
-        r1 = signal.sosfiltfilt(sos, r1)
-        if invert:
-            r1 *= -1
-
-        # translate given offset to new sampling frequency (2*BW)
-        msgstart = int(2 * self.BW * msgstart / self.FS)
+        sos = ncktables.load('butter', [2, self.KR, 2*self.BW],
+                             lambda: { 'sos': signal.butter(2, self.KR,
+                                         'low', fs=2*self.BW, output='sos') })
+        r1 = signal.sosfiltfilt(sos['sos'].astype(self.dtype),
+                                r1.astype(self.dtype, copy=False))
 
         # sample the r1 signal (=decode)
         if msglen == None:
             relevant = r1[msgstart:]
         else:
             relevant = r1[msgstart:msgstart+msglen]
-
-        samplePos = [ w*i for i in range(len(relevant)//w) ]
-        mi,mx = np.min(relevant), np.max(relevant)
-        if self.M == 2:
-            msg = [ 1 if relevant[p] < 0 else 0 for p in samplePos ]
-        elif self.M == 3:
-            mx = 0.9 * max(-mi, mx)
-            mi = -mx
-            d = (mx - mi) / 3
-            msg = []
-            for p in samplePos:
-                if relevant[p] < mi+d:
-                    msg.append(0)
-                elif relevant[p] < mx-d:
-                    msg.append(1)
-                else:
-                    msg.append(2)
-        elif self.M == 4:
-            mx = 0.9 * max(-mi, mx)
-            mi = -mx
-            d = (mx - mi) / 4
-            msg = []
-            for p in samplePos:
-                if relevant[p] < mi+d:
-                    msg.append(0)
-                elif relevant[p] < 0:
-                    msg.append(1)
-                elif relevant[p] < mx-d:
-                    msg.append(2)
-                else:
-                    msg.append(3)
+        if window != None:
+            rcvd = rcvd[w+msgstart:w+msgstart+len(relevant)]
+            r1 = relevant
+        if out is not None:
+            np.copyto(out, r1)
+            r1 = out
+            relevant = r1 if window != None else \
+                       r1[msgstart:msgstart+len(relevant)]
+
+        if sync == None:
+            samplePos = [ w*i for i in range(len(relevant)//w) ]
         else:
-            assert False
+            samplePos = [ int(round(t)) for t in sync.feed(relevant)[0]
+                          if round(t) < len(relevant) ]
+        msg = self.constellation.slice(relevant[samplePos])
 
         return (rcvd, r1, msg, samplePos)
 
+    def demodulate_symbols(self, rcvd, msgstart=0, msglen=None, window=None,
+                           margin=None, taper=False):
+        # integrate-and-dump detector: the lag1 and energy sums are taken
+        # over each symbol interval (w samples from msgstart + w*i) and
+        # dumped once per symbol, no r1 trace and no smoothing filter.
+        # Same arguments and 4-tuple as demodulate(), but r1[i] is the
+        # statistic of symbol i (the soft value is -r1[i], like r1[p]
+        # at demodulate()'s sampling instants) and sp[i] its start.
+        # taper: weigh the sums with a Hann window, which lowers the
+        #   influence of the neighbouring symbols when timing is off
+        rcvd, msgstart, msglen = self._baseband(rcvd, msgstart, msglen,
+                                                window, margin)
+        w = int(2 * self.BW / self.KR) # samples per symbol
+        x = rcvd[msgstart:] if msglen == None else \
+            rcvd[msgstart:msgstart+msglen]
+        n = len(x) // w
+        X = x[:n*w].reshape(n, w).astype(np.float64)
+        g = np.hanning(w + 2)[1:-1] if taper else np.ones(w)
+        X -= (X @ g / np.sum(g))[:, None]
+        s1 = (X[:, :-1] * X[:, 1:]) @ ((g[:-1] + g[1:]) / 2)
+        s2 = (X * X) @ g
+        r1 = (s1 / np.where(s2 > 0, s2, 1)).astype(self.dtype)
+        return (x, r1, self.constellation.slice(r1),
+                [ w*i for i in range(n) ])
+
     pass
 
+# ---------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    # peak memory and time per demodulate() call, without and with a
+    # WORKSPACE, for one minute of signal
+    import time
+    import tracemalloc
+
+    # The symbols are decided, too: both paths share the front end, so
+    # r1 agreeing between them says nothing about r1 being right
+    FS, RUNS = 12000, 5
+    rng = np.random.default_rng(1)
+    for dtype in [np.float64, np.float32]:
+        nck = NCK(FS=FS, CF=1500, BW=500, KR=20, rng=rng, dtype=dtype)
+        syms = rng.integers(0, 2, 1200).tolist()
+        clean = nck.modulate(syms)
+        clean /= np.max(np.abs(clean))
+        sig = (clean + 0.5 * rng.standard_normal(len(clean))).astype(dtype)
+        orig = sig.copy()
+        print(f"{np.dtype(dtype).name}, {len(sig)/FS:.0f} sec at {FS} Hz" + \
+              f" ({sig.nbytes/2**20:.1f} MiB):")
+        ws = WORKSPACE()
+        for name, kw in [('no workspace', {}), ('workspace', {'ws': ws})]:
+            hi = (clean + 0.01 * rng.standard_normal(len(clean))).astype(dtype)
+            msg = nck.demodulate(hi, **kw)[2][1:1+len(syms)]
+            errs = sum([ a != b for a, b in zip(msg, syms) ]) + \
+                   len(syms) - len(msg)
+            print(f"  {name:14s} {errs} symbol error(s) of {len(syms)}" + \
+                  " at high SNR")
+            assert errs <= len(syms) // 100, "demodulation is broken"
+        ref = nck.demodulate(sig)[1].copy()
+        nck.demodulate(sig, ws=ws) # sizes the workspace
+        for name, kw in [('no workspace', {}), ('workspace', {'ws': ws})]:
+            peak, t = [], []
+            for i in range(RUNS):
+                tracemalloc.start()
+                t0 = time.perf_counter()
+                r1 = nck.demodulate(sig, **kw)[1]
+                t.append(time.perf_counter() - t0)
+                peak.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+                assert np.array_equal(r1, ref), "r1 differs"
+            print(f"  {name:14s} peak {max(peak)/2**20:7.1f} MiB per call," + \
+                  f" {1000*min(t):7.1f} ms")
+        print(f"  workspace holds {ws.nbytes()/2**20:.1f} MiB," + \
+              f" input unchanged: {np.array_equal(sig, orig)}")
+
 # eof
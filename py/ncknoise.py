@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+# ncknoise.py
+# pre-generated bank of hued noise, for reproducible NCK modulation
+
+# SW released under the MIT license
+
+# NCK._noise() filters fresh white noise for every symbol. The bank
+# instead holds one long stream of noise per hue, filtered once, and a
+# symbol is a randomly placed slice of that stream. As our LPF/HPF only
+# look at two consecutive samples, a slice has the same spectrum as a
+# freshly generated symbol. The pools do not depend on BW and KR, these
+# only determine the slice length, so one bank file serves all configs.
+#
+# The pools can live in a memory-mapped .npy file (shared by processes,
+# created on first use), and can be refreshed by a background thread.
+#
+# The bank is not a speedup: with the vectorized hue_filter(), fresh
+# generation is as fast (about 8.0 vs 7.7 ms per 200 symbols). It is
+# for runs that should draw from the same noise, e.g. a bank file
+# shared by the processes of a simulation, or kept across sessions.
+#
+# % ./ncknoise.py     # compares the bank's spectra with fresh generation
+
+from ncklib import CONSTELLATION, hue_filter
+import numpy as np
+import os
+import threading
+
+# ---------------------------------------------------------------------------
+
+def hues_for(M):
+    # hues used by NCK.modulate() for M levels, incl. the white ramps
+    return sorted(set(CONSTELLATION(M).hues) | { 0 })
+
+class NOISEBANK:
+
+    def __init__(self, BW, KR, M=2, size=1<<20, path=None, USE_FFT=False,
+                 rng=None, refresh=False):
+        # size     samples per hue pool
+        # path     .npy file for the pools (memory-mapped), or None
+        # rng      np.random.Generator, for reproducible runs
+        # refresh  regenerate the pools piecewise in a background thread
+        self.SPS2 = int(2 * 2 * BW / KR) # samples per symbol, doubled
+        self.hues = hues_for(M)
+        self.USE_FFT = USE_FFT
+        self.rng = np.random.default_rng() if rng == None else rng
+        assert size > 4 * self.SPS2, "bank too small for this BW/KR"
+
+        shape = (len(self.hues), size)
+        if path == None:
+            self.pool = np.empty(shape, dtype=np.float32)
+            self._fill(self.pool, self.rng)
+        elif os.path.isfile(path):
+            self.pool = np.load(path, mmap_mode='r+' if refresh else 'r')
+            assert self.pool.shape == shape, f"{path}: wrong bank shape"
+        else:
+            tmp = path + f'.{os.getpid()}.tmp'
+            pool = np.lib.format.open_memmap(tmp, mode='w+',
+                                             dtype=np.float32, shape=shape)
+            self._fill(pool, self.rng)
+            pool.flush()
+            del pool
+            os.replace(tmp, path) # atomic, concurrent creators are fine
+            self.pool = np.load(path, mmap_mode='r+' if refresh else 'r')
+
+        self._stop = threading.Event()
+        self._thread = None
+        if refresh:
+            self._thread = threading.Thread(target=self._refresher,
+                                            args=(self.rng.spawn(1)[0],),
+                                            daemon=True)
+            self._thread.start()
+
+    def _fill(self, pool, rng, start=0, length=None):
+        length = pool.shape[1] - start if length == None else length
+        wn = 2 * rng.random(length + 1) - 1
+        for i,h in enumerate(self.hues):
+            n = hue_filter(wn, h, self.USE_FFT)
+            pool[i, start:start+length] = n[:length]
+
+    def _refresher(self, rng, block=1<<16, pause=0.05):
+        # overwrites one random block of all pools at a time
+        size = self.pool.shape[1]
+        block = min(block, size)
+        while not self._stop.wait(pause):
+            self._fill(self.pool, rng, int(rng.integers(0, size-block+1)),
+                       block)
+
+    def close(self):
+        self._stop.set()
+        if self._thread != None:
+            self._thread.join()
+
+    def draw(self, hue, rng=None, dtype=float):
+        # returns "two symbols worth" of noise with the given hue,
+        # normalized like NCK._noise(), as an array of dtype
+        rng = self.rng if rng == None else rng
+        i = self.hues.index(hue)
+        off = int(rng.integers(0, self.pool.shape[1] - self.SPS2))
+        n = self.pool[i, off:off+self.SPS2].astype(dtype)
+        if hue == 0:
+            return n
+        return n / np.max(np.abs(n))
+
+    pass
+
+# ---------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    from ncklib import NCK
+    import time
+
+    BW, KR, M, RUNS = 500, 20, 4, 4000
+    rng = np.random.default_rng(1)
+    bank = NOISEBANK(BW, KR, M=M, rng=rng)
+    fresh = NCK(BW=BW, KR=KR, M=M, rng=rng)
+
+    # average power spectra and lag1 autocorrelation, per hue
+    print("hue    max spectral dev (dB)   r1 fresh  r1 bank")
+    ok = True
+    for h in bank.hues:
+        ps_f, ps_b, r_f, r_b = 0, 0, [], []
+        for i in range(RUNS):
+            nf = fresh._noise(h)[:bank.SPS2-1]
+            nb = bank.draw(h)[:bank.SPS2-1]
+            ps_f = ps_f + np.abs(np.fft.rfft(nf))**2
+            ps_b = ps_b + np.abs(np.fft.rfft(nb))**2
+            r_f.append(np.sum(nf[:-1]*nf[1:]) / np.sum(nf*nf))
+            r_b.append(np.sum(nb[:-1]*nb[1:]) / np.sum(nb*nb))
+        # compare in 16 bands, ignoring bands with little power
+        bf = np.array([ np.sum(x) for x in np.array_split(ps_f, 16) ])
+        bb = np.array([ np.sum(x) for x in np.array_split(ps_b, 16) ])
+        sig = bf > 0.05 * np.max(bf)
+        dev = np.max(np.abs(10 * np.log10(bb[sig] / bf[sig])))
+        # r1: means must agree within a few standard errors
+        se = np.std(r_f) / np.sqrt(RUNS)
+        ok &= dev < 0.5 and abs(np.mean(r_f) - np.mean(r_b)) < 5 * se
+        print(f"{h:+.2f}   {dev:8.3f}               {np.mean(r_f):+.4f}  " + \
+              f"{np.mean(r_b):+.4f}")
+    print("bank matches fresh generation:", ok)
+
+    syms = list(rng.integers(0, M, 200))
+    for name, nck in [('fresh', fresh),
+                      ('bank', NCK(BW=BW, KR=KR, M=M, bank=bank))]:
+        t0 = time.process_time()
+        for i in range(10):
+            nck.modulate(syms)
+        print(f"modulate() with {name:5s} noise:",
+              f"{(time.process_time()-t0)/10*1000:.1f} ms per 200 symbols")
+
+# eof
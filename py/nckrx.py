@@ -0,0 +1,613 @@
+#!/usr/bin/env python3
+
+# nckrx.py
+# receiver building blocks for long or continuous recordings: chunked
+# demodulation into a seamless r1 stream, a frame finder that locates
+# and FEC-decodes frames in that stream, a thread pool for both, and a
+# process pool that demodulates one long recording on all cores
+
+# SW released under the MIT license
+
+# Stream positions are sample indices at the 2*BW rate, counted from the
+# start of the recording.
+#
+# usage (demodulate_long() against one pass, in N processes):
+#   % ./nckrx.py [SECONDS] [N]
+
+import concurrent.futures
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+import nckfec
+from ncklib import DOWNCONVERTER, NCK, WORKSPACE
+import numpy as np
+import os
+import scipy.signal as signal
+import threading
+
+# ---------------------------------------------------------------------------
+
+class DECODEPOOL:
+
+    # Fans independent candidates (windows to demodulate, frames to
+    # FEC-decode) out to threads. The filters and resampling in
+    # NCK.demodulate, its lag1 (prefix sums in NumPy, or the nogil Numba
+    # kernel of nckjit), and the FT8 decoder's array operations release
+    # the GIL: threads share the work without the start-up and pickling
+    # cost of processes. What still holds it is the Python between the
+    # array operations, e.g. the symbol sampling and the golay24 and
+    # hamming84 decoders. Each thread gets its own demodulator from
+    # make_nck(), the first time it needs one. Results come back in the
+    # order of the candidates.
+
+    def __init__(self, make_nck=None, threads=None):
+        self.make_nck = make_nck
+        self.threads = threads or os.cpu_count()
+        self.pool = concurrent.futures.ThreadPoolExecutor(self.threads)
+        self.local = threading.local()
+
+    def nck(self):
+        # the calling thread's demodulator
+        if not hasattr(self.local, 'nck'):
+            self.local.nck = self.make_nck()
+        return self.local.nck
+
+    def map(self, fn, *iterables):
+        return list(self.pool.map(fn, *iterables))
+
+    def demodulate(self, rcvd, windows, margin=None):
+        # NCK.demodulate(rcvd, window=..., margin=margin) for each window
+        return self.map(lambda w: self.nck().demodulate(rcvd, window=w,
+                                                        margin=margin),
+                        windows)
+
+    def decode_many(self, ecc, softs):
+        # like nckfec.decode_many(). ldpc96 decodes all rows in one BP
+        # batch whose cost is mostly per iteration, not per row: it is
+        # not split. The other schemes decode row by row, in the threads
+        if ecc == 'ldpc96' or self.threads == 1:
+            return nckfec.decode_many(ecc, softs)
+        return self.map(lambda soft: nckfec.decode(ecc, soft), softs)
+
+    def close(self):
+        self.pool.shutdown()
+
+    pass
+
+# ---------------------------------------------------------------------------
+
+_procnck = {} # per worker process: demodulators, per configuration
+
+def _demod_window(name, shape, dtype, cfg, window, margin):
+    # DEMODPROCS' worker: demodulates a window of the shared signal
+    key = tuple(sorted(cfg.items()))
+    if not key in _procnck:
+        _procnck[key] = NCK(**cfg)
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        rcvd = np.ndarray(shape, dtype, buffer=shm.buf)
+        res = _procnck[key].demodulate(rcvd, window=window, margin=margin)
+        del rcvd # no views into shm may remain when it is closed
+        return res
+    finally:
+        shm.close()
+
+class DEMODPROCS:
+
+    # Process pool for demodulation, a drop-in for DECODEPOOL in
+    # CHUNKDEMOD and FRAMEFINDER: processes also share the Python parts
+    # of demodulate() that hold the GIL. With lag1 in NumPy or Numba
+    # these are small, the gain over threads is smaller than it was with
+    # the per-sample loop (LAG1AUTOCORR, now only nckjit's benchmark
+    # reference). The signal is copied once into
+    # shared memory, the workers demodulate their windows from there:
+    # only the window bounds go out, the window's baseband, r1 and
+    # symbols come back. Each worker builds its own NCK with nck's
+    # receiver settings. The workers are forked when the pool is made,
+    # make it before starting other threads (e.g. nckio.READAHEAD).
+
+    def __init__(self, nck, procs=None):
+        self.cfg = dict(FS=nck.FS, CF=nck.CF, BW=nck.BW, KR=nck.KR, M=nck.M,
+                        USE_FFT=nck.USE_FFT, dtype=nck.dtype.str)
+        self.threads = procs or os.cpu_count() # as in DECODEPOOL
+        # the workers inherit our resource tracker: they attach to the
+        # shared memory we unlink, without trackers of their own
+        resource_tracker.ensure_running()
+        self.pool = multiprocessing.get_context('fork').Pool(self.threads)
+
+    def demodulate(self, rcvd, windows, margin=None):
+        # NCK.demodulate(rcvd, window=..., margin=margin) for each window
+        rcvd = np.ascontiguousarray(rcvd)
+        shm = shared_memory.SharedMemory(create=True,
+                                         size=max(1, rcvd.nbytes))
+        try:
+            np.ndarray(rcvd.shape, rcvd.dtype, buffer=shm.buf)[:] = rcvd
+            return self.pool.starmap(_demod_window,
+                                     [ (shm.name, rcvd.shape, rcvd.dtype.str,
+                                        self.cfg, w, margin)
+                                       for w in windows ])
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def decode_many(self, ecc, softs):
+        # like DECODEPOOL.decode_many(), row by row in the workers
+        if ecc == 'ldpc96' or self.threads == 1:
+            return nckfec.decode_many(ecc, softs)
+        return self.pool.starmap(nckfec.decode, [ (ecc, soft)
+                                                  for soft in softs ])
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    pass
+
+def demodulate_long(nck, rcvd, pool, window=None, margin=None):
+    # nck.demodulate(rcvd, window=window, margin=margin) of a long
+    # signal, in one piece per worker of pool (a DEMODPROCS or a
+    # DECODEPOOL). The pieces hold whole symbols and overlap by the
+    # front end's settling time plus four symbols (the r1 smoothing
+    # settles in three, the lag1 window is one), their baseband, r1 and
+    # sampling positions are joined and the symbols sliced once, as in
+    # one pass, up to rounding (and in the last few symbols of rcvd,
+    # where demodulate()'s padding meets the piece's own level).
+    # window: (start, stop) in samples at FS, default all
+    start, stop = (0, len(rcvd)) if window == None else window
+    dc = DOWNCONVERTER(nck.FS, nck.CF, nck.BW)
+    w = int(2 * nck.BW / nck.KR) # samples per symbol, at 2*BW
+    p = dc.period()
+    k = int(round(p * 2 * nck.BW / nck.FS)) # p, at 2*BW
+    unit = p * (w // np.gcd(w, k)) # whole periods and symbols
+    overlap = dc.settle() + int(np.ceil(4 * nck.FS / nck.KR))
+    overlap = (overlap + p - 1) // p * p
+    n = max(unit, -(-(stop - start) // pool.threads) // unit * unit)
+    pieces = [ (a, min(stop, a + n)) for a in range(start, stop, n) ]
+    rs = pool.demodulate(rcvd, pieces, margin=overlap if margin == None
+                                              else max(margin, overlap))
+    bb = np.concatenate([ r[0] for r in rs ])
+    r1 = np.concatenate([ r[1] for r in rs ])
+    pos, base = [], 0
+    for r in rs:
+        pos += [ base + i for i in r[3] ]
+        base += len(r[1])
+    return bb, r1, nck.constellation.slice(r1[pos]), pos
+
+# ---------------------------------------------------------------------------
+
+class SQUELCH:
+
+    # Energy gate for a monitoring receiver: most of the time the band
+    # is empty, and the demodulator's lag-1 stage (and the FEC behind
+    # it) need not run. The in-band power, after a cheap IIR bandpass
+    # and smoothed over 'tau' seconds, is compared with a noise floor
+    # that follows the power down within a second, and up within 'rise'
+    # seconds while the gate is closed (ten times slower while it is
+    # open, in case the noise level rose). The gate opens 'open_db' above the floor and closes
+    # again below 'close_db' (hysteresis). Decisions are made per block
+    # of one symbol, at FS. During the first 'learn' seconds the floor
+    # is the power itself, and the gate is open: what follows (e.g. the
+    # frame finder) gets to see the noise, too.
+
+    def __init__(self, nck, open_db=1.0, close_db=0.5, tau=0.5, rise=10,
+                 learn=10):
+        self.bs = max(1, int(nck.FS / nck.KR)) # block size, in samples
+        lo, hi = nck.CF - nck.BW/2, nck.CF + nck.BW/2
+        if nck.CF == 0: # the signal is in 0..BW
+            lo, hi = 0, nck.BW
+        if lo > 0:
+            self.sos = signal.butter(4, [lo, hi], 'pass', fs=nck.FS,
+                                     output='sos')
+        else:
+            self.sos = signal.butter(4, hi, 'low', fs=nck.FS, output='sos')
+        self.open_ratio = 10**(open_db / 10)
+        self.close_ratio = 10**(close_db / 10)
+        self.a = min(1, self.bs / (tau * nck.FS))
+        self.up = self.bs / (rise * nck.FS)
+        self.down = self.bs / nck.FS
+        self.learn = int(learn * nck.FS / self.bs)
+        self.floor = None
+        self.reset(0)
+
+    def reset(self, pos):
+        # the stream (re)starts at sample pos, the floor is kept
+        self.pos = pos # next sample expected
+        self.zi = np.zeros((self.sos.shape[0], 2))
+        self.acc, self.nacc = 0., 0 # partial block
+        self.p = None  # smoothed power
+        self.on = False
+        self.flags = [] # per block since block0: gate open
+        self.block0 = (pos + self.bs - 1) // self.bs
+        self.skip = self.block0 * self.bs - pos # until the first block
+
+    def feed(self, pos, x):
+        # consumes the samples x starting at sample pos (a later pos
+        # than expected is a gap, samples seen before are ignored)
+        if pos > self.pos:
+            self.reset(pos)
+        x = x[self.pos - pos:]
+        if len(x) == 0:
+            return
+        self.pos += len(x)
+        y, self.zi = signal.sosfilt(self.sos, x, zi=self.zi)
+        y = y[self.skip:]
+        self.skip = max(0, self.skip - len(x))
+        # complete the partial block, then whole blocks
+        n = min(len(y), self.bs - self.nacc)
+        self.acc += np.sum(y[:n]**2)
+        self.nacc += n
+        if self.nacc < self.bs:
+            return
+        y = y[n:]
+        k = len(y) // self.bs
+        powers = [self.acc / self.bs] + \
+                 list(np.mean(y[:k*self.bs].reshape(k, self.bs)**2, axis=1))
+        self.acc = np.sum(y[k*self.bs:]**2)
+        self.nacc = len(y) - k*self.bs
+        for pw in powers:
+            self.p = pw if self.p == None else self.p + self.a*(pw - self.p)
+            if self.learn > 0:
+                self.learn -= 1
+                self.floor = self.p
+                self.flags.append(True)
+                continue
+            if self.p < self.floor:
+                self.floor += self.down * (self.p - self.floor)
+            if self.on:
+                self.on = self.p > self.close_ratio * self.floor
+            else:
+                self.on = self.p > self.open_ratio * self.floor
+            if self.p > self.floor:
+                self.floor += self.up * (self.p - self.floor) / \
+                              (10 if self.on else 1)
+            self.flags.append(self.on)
+
+    def active(self, start, stop, pre, hang):
+        # per block of start..stop (samples, multiples of the block
+        # size): the gate is open within 'pre' blocks after it or within
+        # 'hang' blocks before it. Blocks not seen yet (past the end of
+        # the stream) count as closed
+        b0, b1 = start // self.bs - self.block0, stop // self.bs - self.block0
+        f = np.zeros(max(0, b1 + pre) - max(0, b0 - hang), dtype=bool)
+        off = max(0, b0 - hang)
+        known = self.flags[off : b1 + pre]
+        f[:len(known)] = known
+        # dilate: hang blocks forward, pre blocks backward
+        g = np.convolve(f, np.ones(pre + hang + 1), 'full') > 0
+        return g[pre + (b0 - off) : pre + (b1 - off)] if b1 > b0 else \
+               np.zeros(0, dtype=bool)
+
+    def forget(self, before):
+        # drops the flags of blocks before sample 'before'
+        n = before // self.bs - self.block0
+        if n > 0:
+            del self.flags[:n]
+            self.block0 += n
+
+    pass
+
+# ---------------------------------------------------------------------------
+
+class CHUNKDEMOD:
+
+    # Demodulates a long signal chunk by chunk. A chunk covers 'hop'
+    # samples plus a margin on each side in which the filters settle,
+    # the r1 segments of consecutive chunks join without a seam.
+    #
+    # With a SQUELCH, only the spans where the gate is open are
+    # demodulated, r1 is NaN elsewhere (which the frame finder does not
+    # evaluate, like digital silence). Spans start 'pre' seconds before
+    # the gate opens, for a frame that was below the threshold at its
+    # start: the margin is made that long, the squelch looks ahead into
+    # it. They end 'hang' seconds after it closes. The frame finder
+    # estimates its noise floor from the noise around a frame: a frame's
+    # length for 'pre' and four for 'hang' work well.
+    #
+    # With a DECODEPOOL (or DEMODPROCS), the spans are cut into one
+    # piece per thread and demodulated concurrently, each with its own
+    # settling margin.
+
+    def __init__(self, nck, chunk_sec=60, margin=None, squelch=None,
+                 pre=2, hang=8, pool=None):
+        self.nck = nck
+        self.pool = pool
+        # the front end's period: pieces join without a seam
+        q = DOWNCONVERTER(nck.FS, nck.CF, nck.BW).period()
+        if margin == None: # three symbols
+            margin = int(3 * nck.FS / nck.KR)
+        self.squelch = squelch
+        if squelch != None:
+            # spans are made of whole blocks, starting on aligned samples
+            q = np.lcm(q, squelch.bs)
+            self.pre = int(np.ceil(pre * nck.FS / squelch.bs))
+            self.hang = int(np.ceil(hang * nck.FS / squelch.bs))
+        self.q = q
+        self.settle = (margin + q - 1) // q * q
+        self.margin = self.settle if squelch == None else \
+                      max(self.settle, (self.pre*squelch.bs + q - 1) // q * q)
+        self.hop = max(q, int(chunk_sec * nck.FS) // q * q)
+        self.ratio = 2 * nck.BW / nck.FS # 2*BW rate over FS
+        self.samples = 0 # processed
+        self.active = 0  # ... of which demodulated
+        self.ws = WORKSPACE() # chunks have the same length, reused
+
+    def process(self, start, chunk, a=None):
+        # chunk: samples[start-margin : start+hop+margin], clipped to the
+        # recording (as produced by nckio.chunks()), a is the index of
+        # chunk[0] if the chunk is clipped elsewhere (e.g. after a gap).
+        # Returns (pos, r1) where pos is the stream position of r1[0]
+        a = max(0, start - self.margin) if a == None else a
+        stop = min(start + self.hop, a + len(chunk))
+        pos = int(round(start * self.ratio))
+        self.samples += stop - start
+        if not np.any(chunk): # digital silence, nothing to normalize
+            return pos, np.zeros(int(self.ratio * (stop - start)),
+                                 dtype=self.nck.dtype)
+        if self.squelch == None:
+            spans = [ (start, stop) ]
+        else:
+            spans = self._spans(start, stop, chunk, a)
+        r1 = np.full(int(self.ratio * (stop - start)), np.nan,
+                     dtype=self.nck.dtype)
+        spans = [ (s0, s1) for s0, s1 in self._split(spans)
+                  if np.any(chunk[s0 - a : s1 - a]) ] # silent: zeroed below
+        windows = [ (s0 - a, s1 - a) for s0, s1 in spans ]
+        if self.pool == None:
+            rs = [ self.nck.demodulate(chunk, window=w, margin=self.settle,
+                                       ws=self.ws) for w in windows ]
+        else:
+            rs = self.pool.demodulate(chunk, windows, margin=self.settle)
+        for (s0, s1), (_, r, _, _) in zip(spans, rs):
+            self.active += s1 - s0
+            i = int(round(s0 * self.ratio)) - pos
+            r1[i : i + len(r)] = r[:len(r1) - i]
+        # r1 is meaningless where the input was digitally silent for a
+        # symbol or longer (a transmitter's gaps): set it to 0 there
+        sps = int(self.nck.FS / self.nck.KR)
+        nz = np.convolve(chunk != 0, np.ones(sps), 'same')
+        i = start - a + (np.arange(len(r1)) / self.ratio).astype(int)
+        r1[nz[np.minimum(i, len(nz) - 1)] == 0] = 0
+        return pos, r1
+
+    def _split(self, spans):
+        # spans cut into about one aligned piece per thread of the pool,
+        # pieces shorter than four margins are not worth their margins
+        if self.pool == None or self.pool.threads == 1:
+            return spans
+        total = sum([ s1 - s0 for s0, s1 in spans ])
+        n = max(total // self.pool.threads, 4 * self.settle)
+        n = (n + self.q - 1) // self.q * self.q
+        return [ (p, min(s1, p + n)) for s0, s1 in spans
+                 for p in range(s0, s1, n) ]
+
+    def _spans(self, start, stop, chunk, a):
+        # (s0, s1) ranges of start..stop where the squelch is open
+        sq = self.squelch
+        sq.feed(a, chunk)
+        bs = sq.bs
+        b1 = (stop + bs - 1) // bs * bs
+        on = sq.active(start, b1, self.pre, self.hang)
+        sq.forget(start + self.hop - self.hang * bs)
+        spans, i = [], 0
+        while i < len(on):
+            if not on[i]:
+                i += 1
+                continue
+            j = i
+            while j < len(on) and on[j]:
+                j += 1
+            spans.append((start + i*bs, min(stop, start + j*bs)))
+            i = j
+        return spans
+
+    pass
+
+# ---------------------------------------------------------------------------
+
+class FRAMEFINDER:
+
+    # Frames have no sync word: every stream position is scored as the
+    # start of a frame of nsym symbols (plus the two ramp symbols) by
+    # the mean |r1| at the symbol centers. Peaks that stand out from the
+    # noise floor are handed to the FEC decoder.
+
+    HIST = 20 # frame lengths of scores for the noise floor
+    LEARN = 5 # ... before the first positions are judged
+
+    def __init__(self, nck, nsym, ecc=None, threshold=1.4, pool=None):
+        # threshold: required score, relative to the running noise floor.
+        # pool: optional DECODEPOOL, for the candidates' FEC decoding
+        assert nck.M == 2, "the frame finder supports M=2 only"
+        self.nck = nck
+        self.pool = pool
+        self.nsym = nsym
+        self.ecc = ecc
+        self.threshold = threshold
+        self.w = int(2 * nck.BW / nck.KR) # samples per symbol
+        self.span = (nsym + 2) * self.w
+        self.buf = np.zeros(0, dtype=nck.dtype)
+        self.valid = np.zeros(0, dtype=bool) # buf was demodulated
+        self.buf_pos = 0  # stream position of buf[0]
+        self.next = 0     # first position not yet evaluated
+        self.floor = None # running noise floor of the score
+        self.hist = np.zeros(0) # recent scores, for the floor
+        self.counted = 0 # stream position up to which they are in hist
+
+    def reset(self, pos):
+        # forgets the buffered stream, which continues at position pos
+        # (after a gap)
+        self.buf = np.zeros(0, dtype=self.nck.dtype)
+        self.valid = np.zeros(0, dtype=bool)
+        self.buf_pos = pos
+        self.next = pos
+
+    def _scores(self, a, b):
+        # scores for frame starts at buffer indices a..b-1, and whether
+        # all of the frame's symbols were demodulated (not gated by a
+        # squelch)
+        r = np.abs(self.buf)
+        s = np.zeros(b - a)
+        full = np.ones(b - a, dtype=bool)
+        for i in range(1, self.nsym + 1):
+            s += r[a + i*self.w : b + i*self.w]
+            full &= self.valid[a + i*self.w : b + i*self.w]
+        return s / self.nsym, full
+
+    def soft(self, p):
+        # soft values of the frame starting at buffer index p
+        return -8 * self.buf[p + self.w : p + self.span - self.w : self.w]
+
+    def _candidates(self, s, i0, i1):
+        # frame starts to try for the run s[i0:i1] above the threshold.
+        # The score hardly changes when shifted by whole symbols, the FEC
+        # has to find the alignment: the symbol phase is taken from the
+        # run folded modulo w, all positions in that phase are tried,
+        # each also slightly early and late
+        w = self.w
+        idx = np.arange(i0, i1)
+        fold = np.bincount(idx % w, s[i0:i1], w) / \
+               np.maximum(np.bincount(idx % w, None, w), 1)
+        ph = int(np.argmax(fold))
+        ks = range(i0 - w + (ph - i0 + w) % w, i1 + w, w)
+        return [ j + d for j in ks for d in [0, -w//8, w//8] ]
+
+    def _best(self, s, a, ps):
+        # returns (p, ok, payload bits) for the best of the frame starts
+        # ps, given as indices into s (buffer index minus a)
+        w = self.w
+        # skip starts that reach into digital silence, incl. the ramps
+        # (r1 is 0 there, any codeword fits)
+        ps = [ p for p in ps if np.all(self.buf[a+p : a+p+self.span : w]) ]
+        if len(ps) == 0:
+            return None, False, None
+        if self.ecc == None:
+            # nothing to verify: the best score, where a shift by whole
+            # symbols is told by the ramps, which carry no hue
+            r = np.abs(self.buf)
+            p = max(ps, key=lambda p: self.nsym * s[min(max(p, 0), len(s)-1)]
+                                      - r[a + p] - r[a + p + self.span - w])
+            return p, True, [ 1 if x > 0 else 0 for x in self.soft(a+p) ]
+        softs = [ self.soft(a + p) for p in ps ]
+        decode_many = nckfec.decode_many if self.pool == None else \
+                      self.pool.decode_many
+        best = (None, False, None, 0)
+        for p, soft, (ok, data) in zip(ps, softs,
+                                       decode_many(self.ecc, softs)):
+            if ok:
+                d = nckfec.soft_distance(self.ecc, soft, data) / \
+                    np.sum(np.abs(soft))
+                if best[0] == None or d < best[3]:
+                    best = (p, ok, data, d)
+        return best[:3]
+
+    def feed(self, pos, r1, final=False):
+        # appends the r1 segment starting at stream position pos,
+        # returns the list of frames found, as dicts. final: the stream
+        # ends with this segment
+        assert pos == self.buf_pos + len(self.buf), "gap in r1 stream"
+        w = self.w
+        self.buf = np.concatenate((self.buf, np.nan_to_num(r1),
+                                   np.zeros(w if final else 0,
+                                            dtype=self.nck.dtype)))
+        self.valid = np.concatenate((self.valid, ~np.isnan(r1),
+                                     np.ones(w if final else 0, dtype=bool)))
+        # evaluate positions whose frame and a one symbol guard are in
+        a = self.next - self.buf_pos
+        b = len(self.buf) - self.span - w
+        found = []
+        if b > a:
+            s, full = self._scores(a, b + w)
+            # the floor is the median score of the last HIST frame
+            # lengths, whatever the segments' size. Frames reaching into
+            # silence or squelched r1 do not count (nor can they be
+            # decoded)
+            k = max(0, self.counted - self.buf_pos - a)
+            use = full[k:b-a] & (s[k:b-a] > 0)
+            if np.any(use):
+                self.hist = np.concatenate((self.hist, s[k:b-a][use]))
+                self.hist = self.hist[-self.HIST * self.span:]
+                self.floor = np.median(self.hist)
+            self.counted = max(self.counted, self.buf_pos + b)
+            # at the start of the stream, the positions wait for a floor
+            # learnt from LEARN frame lengths: from the first chunk only,
+            # a frame there would be measured against itself. Squelched
+            # streams learn slowly, the buffer is bounded by HIST
+            if len(self.hist) < self.LEARN * self.span and \
+               len(self.buf) < self.HIST * self.span and not final:
+                b = a
+            # the score dips between symbol phases, a frame is one run
+            if self.floor == None: # nothing to look at, yet
+                above = np.zeros(len(s), dtype=bool)
+            else:
+                above = np.convolve(s > self.threshold * self.floor,
+                                    np.ones(w), 'same') > 0
+            i = 0
+            while i < b - a:
+                if not above[i]:
+                    i += 1
+                    continue
+                i1 = i
+                while i1 < len(s) and above[i1]:
+                    i1 += 1
+                if i1 >= b - a and not final: # run not complete yet
+                    break
+                ps = [ p for p in self._candidates(s, i, i1) if
+                       a + p >= 0 and a + p + self.span <= len(self.buf) ]
+                p, ok, data = self._best(s, a, ps)
+                if ok:
+                    found.append({
+                        'pos'  : self.buf_pos + a + p,
+                        't'    : (self.buf_pos + a + p) / (2 * self.nck.BW),
+                        'score': float(s[min(max(p, 0), len(s)-1)] /
+                                       self.floor),
+                        'ok'   : self.ecc != None,
+                        'data' : ''.join([ str(x) for x in data ]),
+                        'bits' : ''.join([ '1' if x > 0 else '0' for x in
+                                           self.soft(a + p) ]),
+                    })
+                    i = max(i + 1, p + self.span - w) # skip the frame
+                else:
+                    i = i1
+            self.next = self.buf_pos + a + min(i, b - a)
+        # keep what is needed for positions from self.next onwards
+        drop = max(0, self.next - self.buf_pos)
+        self.buf = self.buf[drop:]
+        self.valid = self.valid[drop:]
+        self.buf_pos += drop
+        return found
+
+    def flush(self):
+        # returns the frames found at the end of the stream
+        return self.feed(self.buf_pos + len(self.buf), np.zeros(0), True)
+
+    pass
+
+# ---------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    sec = float(sys.argv[1]) if len(sys.argv) > 1 else 600
+    procs = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    FS, CF, BW, KR = 6000, 1250, 500, 20
+    nck = NCK(FS=FS, CF=CF, BW=BW, KR=KR)
+    rcvd = np.random.default_rng(1).standard_normal(int(sec * FS))
+
+    t = time.perf_counter()
+    _, r1, msg, _ = nck.demodulate(rcvd)
+    t1 = time.perf_counter() - t
+    pool = DEMODPROCS(nck, procs)
+    t = time.perf_counter()
+    _, r1p, msgp, _ = demodulate_long(nck, rcvd, pool)
+    t2 = time.perf_counter() - t
+    pool.close()
+    last = 4 * int(2 * BW / KR) # the last symbols, see demodulate_long()
+    print(f"{sec:.0f} sec at FS={FS} CF={CF} BW={BW} KR={KR}," + \
+          f" {os.cpu_count()} core(s)")
+    print(f"one pass     {t1:7.2f} sec wall")
+    print(f"{procs:2d} processes {t2:7.2f} sec wall, {t1/t2:.2f}x," + \
+          f" max |r1 diff| {np.max(np.abs(r1 - r1p)[:-last]):.1e}," + \
+          f" {sum([ a != b for a, b in zip(msg, msgp) ])} symbol(s)" + \
+          " differ")
+
+# eof
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+# nckscan.py
+# band scan: finds NCK signals of unknown center frequency and bandwidth
+# in a recording, in one pass over the audio
+
+# SW released under the MIT license
+
+# demodulate() needs CF and BW. The scan tries all of them at once, in
+# the spectrum: every NCK symbol is noise whose power leans towards one
+# edge of the band, the lag1 autocorrelation the demodulator measures
+# is, at 2*BW samples per sec,
+#
+#   r1 = sum over f in band of P(f) * cos(pi * (f - lo) / BW) / sum P(f)
+#
+# With an STFT of one symbol's length (half a symbol's hop), r1 of any
+# subband costs a dot product per frame. Subbands of each bandwidth in
+# 'bws' are placed every BW/8 across 'band', and per time slot two
+# statistics are kept, both near 1 for noise:
+#
+#   hue    variance of r1 over the slot, relative to the median of all
+#          slots and subbands of that bandwidth. Symbols flip the hue,
+#          the variance grows
+#   power  in-band power density over the density of the guard bands
+#          (BW/4 on each side): a subband inside a wider signal, or
+#          much wider than its signal, gets little of it
+#
+# The score is their product. Candidates are the best scores above a
+# threshold, grown over neighbouring slots at the same CF and BW, and
+# suppress overlapping ones (like FT8's sync candidate search). CF is
+# refined to the center of the excess power in the candidate's slots.
+#
+# usage:
+#   % ./nckscan.py capture.wav [KR]
+
+import nckio
+import numpy as np
+
+# ---------------------------------------------------------------------------
+
+class BANDSCAN:
+
+    def __init__(self, fs, kr=20, bws=(250, 500, 1000), band=(200, 2900),
+                 slot=1.0):
+        # kr    keying rate the STFT is sized for, scans work for rates
+        #       up to about twice as fast, and all slower ones
+        # slot  time resolution of the candidates, in seconds
+        self.fs = fs
+        self.nfft = int(fs / kr)   # one symbol
+        self.hop = self.nfft // 2
+        self.spf = max(1, int(round(slot * fs / self.hop))) # frames/slot
+        self.slot = self.spf * self.hop / fs
+        self.win = np.hanning(self.nfft)
+        self.f = np.fft.rfftfreq(self.nfft, 1 / fs)
+        df = self.f[1]
+        self.subbands = [] # (bw, cfs, in-band, hue, guard weights)
+        for bw in bws:
+            cfs = np.arange(band[0] + bw/2, band[1] - bw/2 + 1, bw/8)
+            if len(cfs) == 0 or bw < 4 * df: # too few bins to see a hue
+                continue
+            lo = cfs[:, None] - bw/2
+            d = self.f[None, :] - lo
+            inb = (d >= 0) & (d <= bw)
+            guard = ((d >= -bw/4) & (d < 0)) | ((d > bw) & (d <= 5*bw/4))
+            self.subbands.append((bw, cfs, inb.astype(float),
+                                  np.where(inb, np.cos(np.pi * d / bw), 0),
+                                  guard / np.maximum(1, guard.sum(1))[:, None]))
+        # per slot and bandwidth: sums of r1, r1**2, in-band power
+        # and guard power density; and the mean spectrum per slot
+        self.acc = [ [] for _ in self.subbands ]
+        self.spec = []
+
+    def feed(self, x):
+        # x: the next slots of the recording, a whole number of them
+        # (see block()) plus nfft - hop samples of lookahead
+        n = (len(x) - self.nfft) // self.hop + 1
+        n -= n % self.spf
+        if n <= 0:
+            return
+        fr = np.lib.stride_tricks.sliding_window_view(x, self.nfft)
+        P = np.abs(np.fft.rfft(fr[:n*self.hop:self.hop] * self.win)) ** 2
+        k = n // self.spf
+        self.spec.append(P.reshape(k, self.spf, -1).mean(1))
+        for acc, (bw, cfs, inb, hue, guard) in zip(self.acc, self.subbands):
+            pw = P @ inb.T
+            r1 = (P @ hue.T) / np.maximum(pw, 1e-30)
+            pg = P @ guard.T
+            s = np.stack((r1, r1 * r1, pw / inb.sum(1), pg))
+            acc.append(s.reshape(4, k, self.spf, -1).sum(2))
+
+    def block(self, slots=60):
+        # (hop, lookahead) in samples, for feeding a recording in pieces
+        return slots * self.spf * self.hop, self.nfft - self.hop
+
+    def scores(self):
+        # returns [ (bw, cfs, hue, power) ], the statistics as arrays of
+        # shape (slots, len(cfs))
+        res = []
+        for acc, (bw, cfs, _, _, _) in zip(self.acc, self.subbands):
+            if len(acc) == 0:
+                continue
+            s1, s2, pw, pg = np.concatenate(acc, axis=1) / self.spf
+            var = s2 - s1 * s1
+            hue = var / max(np.median(var), 1e-30)
+            power = pw / np.maximum(pg, 1e-30)
+            res.append((bw, cfs, hue, power))
+        return res
+
+    def candidates(self, threshold=2.5, n=20):
+        # the n best candidates scoring above threshold, as dicts with
+        # cf, bw, t (start in seconds), dur, score, hue and power. The
+        # score is the best slot's
+        cells = []
+        for bw, cfs, hue, power in self.scores():
+            score = hue * power
+            for j, i in zip(*np.nonzero(score >= threshold)):
+                cells.append((score[j, i], bw, cfs, i, j, score, hue, power))
+        cells.sort(key=lambda c: -c[0])
+        found = []
+        for sc, bw, cfs, i, j, score, hue, power in cells:
+            cf = cfs[i]
+            if any(cf - bw/2 < c['cf'] + c['bw']/2 and
+                   c['cf'] - c['bw']/2 < cf + bw/2 and
+                   c['j0'] - 1 <= j <= c['j1'] for c in found):
+                continue
+            j0, j1 = j, j + 1 # the run of slots above the threshold
+            while j0 > 0 and score[j0 - 1, i] >= threshold:
+                j0 -= 1
+            while j1 < len(score) and score[j1, i] >= threshold:
+                j1 += 1
+            found.append({ 'cf': self._refine(cf, bw, j0, j1), 'bw': bw,
+                           't': j0 * self.slot, 'dur': (j1 - j0) * self.slot,
+                           'score': float(sc), 'hue': float(hue[j, i]),
+                           'power': float(power[j, i]), 'j0': j0, 'j1': j1 })
+            if len(found) == n:
+                break
+        for c in found:
+            del c['j0'], c['j1']
+        return found
+
+    def _refine(self, cf, bw, j0, j1):
+        # center of the power above the guard bands' level, slots j0..j1
+        S = np.concatenate(self.spec)[j0:j1].mean(0)
+        d = self.f - (cf - bw/2)
+        near = (d >= -bw/4) & (d <= 5*bw/4)
+        guard = near & ((d < 0) | (d > bw))
+        ex = np.where(near, np.maximum(S - np.median(S[guard]), 0), 0)
+        if not np.any(guard) or np.sum(ex) == 0:
+            return float(cf)
+        return float(np.sum(self.f * ex) / np.sum(ex))
+
+    pass
+
+# ---------------------------------------------------------------------------
+
+def scan(samples, fs, kr=20, bws=(250, 500, 1000), band=(200, 2900),
+         slot=1.0, threshold=2.5, n=20):
+    # one pass over samples (e.g. memory-mapped, nckio.open_audio()),
+    # returns BANDSCAN.candidates()
+    bs = BANDSCAN(fs, kr, bws, band, slot)
+    hop, look = bs.block()
+    for start in range(0, len(samples), hop):
+        bs.feed(nckio.to_float(samples[start : start + hop + look]))
+    return bs.candidates(threshold, n)
+
+# ---------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    import sys
+
+    fs, samples = nckio.open_audio(sys.argv[1])
+    kr = float(sys.argv[2]) if len(sys.argv) > 2 else 20
+    for c in scan(samples, fs, kr):
+        print(f"cf={c['cf']:6.0f} bw={c['bw']:4.0f} t={c['t']:7.1f}" + \
+              f" dur={c['dur']:4.1f} score={c['score']:.1f}")
+
+# eof
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+
+# ncksim.py
+# one simulation round of NCK over a simulated channel, and the simulation of
+# one (kr,snr) point with checkpointing into a result store
+
+# SW released under the MIT license
+
+# A configuration is a plain dict with the following keys:
+#   fs, cf, bw, kr  sampling freq, center freq, bandwidth, keying rate
+#   M               number of noise levels (2, 3 or 4)
+#   ecc             None, 'ft8', 'golay24', 'hamming84' or 'ldpc96'
+#   length          payload length in bits (ignored for 'ft8', 'ldpc96')
+#   fft             use FFT instead of our LPF,HPF
+#   snr             SNR in dB, specific to the signal's bandwidth
+# optional channel impairments (see nckchannel.CHANNEL):
+#   fading, qsb, sco_ppm, foffset
+# optional receiver settings:
+#   sync            track the symbol timing (ncklib.SYMBOLSYNC)
+#   iad             integrate-and-dump detector, one r1 per symbol
+#                   (NCK.demodulate_symbols(), ignores sync)
+# optional:
+#   noisebank       draw the symbols' noise from a ncknoise.NOISEBANK
+#                   (the same pools in every round, not faster)
+#   dtype           'float32' for single precision signal buffers
+
+import nckchannel
+import nckfec
+import ncklib
+import ncknoise
+import numpy as np
+import os
+import time
+
+PADLEN = 5 # in sec, silence before and after the signal
+
+# ---------------------------------------------------------------------------
+
+def frame_lengths(ecc, length):
+    # returns (data length, overhead length) in bits for the given ECC
+    if ecc == 'ft8':
+        return 91, 174 - 91
+    if ecc == 'golay24':
+        length = 12 * ((length + 11) // 12)
+        return length, length
+    if ecc == 'hamming84':
+        length = 4 * ((length + 3) // 4)
+        return length, length
+    if ecc == 'ldpc96':
+        return 50, 96 - 50
+    return length, 0
+
+def bits_to_symbols(bits, M):
+    # maps bits to a list of symbols in [0..M-1], returns (symlst, padding)
+    # where padding is the number of zero bits appended to fill a group
+    return ncklib.CONSTELLATION(M).bits_to_symbols(bits)
+
+def symbols_to_bits(msg, M):
+    # inverse of bits_to_symbols(), including the padding bits
+    return ncklib.CONSTELLATION(M).symbols_to_bits(msg)
+
+_banks = {}
+
+def noise_bank(cfg):
+    # one shared noise bank per process and configuration. The pools are
+    # filled from a fixed seed, the same in every process and session
+    # (the draws come from one_round's seeded generator)
+    key = (cfg['bw'], cfg['kr'], cfg.get('M', 2), cfg['fft'])
+    if not key in _banks:
+        _banks[key] = ncknoise.NOISEBANK(cfg['bw'], cfg['kr'],
+                                         M=cfg.get('M', 2),
+                                         USE_FFT=cfg['fft'],
+                                         rng=np.random.default_rng(0))
+    return _banks[key]
+
+def one_round(cfg):
+    # simulates the transmission of one frame,
+    # returns the number of bit errors and frame errors (0 or 1)
+    M = cfg.get('M', 2)
+    # with a bank, the draws come from a generator seeded from np.random
+    # (without, NCK uses np.random itself): a chunk is reproduced from
+    # its seed either way
+    bank = noise_bank(cfg) if cfg.get('noisebank') else None
+    nck = ncklib.NCK(FS=cfg['fs'], CF=cfg['cf'], BW=cfg['bw'],
+                     KR=cfg['kr'], M=M, USE_FFT=cfg['fft'], bank=bank,
+                     rng=None if bank == None else
+                         np.random.default_rng(np.random.randint(2**32)),
+                     dtype=cfg.get('dtype', 'float64'))
+
+    length, _ = nckfec.frame_bits(cfg['ecc'], cfg['length'])
+    data = [ int(x) for x in np.random.randint(2, size=length) ]
+    bits = nckfec.encode(cfg['ecc'], data)
+
+    symlst, _ = bits_to_symbols(bits, M)
+    audio = nck.modulate(symlst)
+
+    audio /= np.max(np.abs(audio)) # normalize
+    audioLen = len(audio)
+
+    # pad with silence on each side, apply channel impairments and noise
+    audio = nckchannel.pad(audio, nck.FS, PADLEN)
+    start = PADLEN * nck.FS # the frame's position, after the channel
+    if cfg.get('fading') or cfg.get('qsb') or cfg.get('sco_ppm') or \
+       cfg.get('foffset'):
+        ch = nckchannel.CHANNEL(FS=nck.FS, BW=nck.BW, fading=cfg.get('fading'),
+                                qsb=cfg.get('qsb'),
+                                sco_ppm=cfg.get('sco_ppm', 0),
+                                foffset=cfg.get('foffset', 0),
+                                # from the seeded state: reproducible
+                                rng=np.random.default_rng(
+                                        np.random.randint(2**32)))
+        audio = ch.apply(audio)
+        start += ch.latency()
+    audio = nckchannel.awgn(audio, cfg['snr'], cfg['bw'], cfg['fs'],
+                            siglen=audioLen)
+
+    audio /= np.max(np.abs(audio))
+    bits = "".join([str(b) for b in bits]) # this is the msg we sent
+
+    rcvd = np.array( [x for x in audio] ) # this is the audio we received
+    # demodulate the frame's region only, skip the ramp up symbol
+    if cfg.get('iad'):
+        bband, r1, msg, pos = nck.demodulate_symbols(
+                                  rcvd, window=(start, start + audioLen))
+        r1s = r1[1:1+len(symlst)]
+    else:
+        sync = ncklib.SYMBOLSYNC(int(2 * nck.BW / nck.KR)) \
+               if cfg.get('sync') else None
+        bband, r1, msg, pos = nck.demodulate(rcvd,
+                                             window=(start, start + audioLen),
+                                             sync=sync)
+        r1s = [ r1[p] for p in pos[1:1+len(symlst)] ]
+
+    msg = symbols_to_bits(msg[1:1+len(symlst)], M)[:len(bits)]
+    msgstr = ''.join([str(b) for b in msg])
+    err = 0
+    for i in range(len(bits)):
+        if bits[i] != msgstr[i]:
+            err += 1
+
+    if cfg['ecc'] == None:
+        return err, 1 if err > 0 else 0
+    # soft values as nckfec expects them (positive for a '1'): from r1
+    # for ldpc96 with M=2, else from the decided bits
+    if cfg['ecc'] == 'ldpc96' and M == 2:
+        soft = [ -8*r for r in r1s ]
+    else:
+        soft = [ 4.5 if b else -4.5 for b in msg ]
+    _, corr = nckfec.decode(cfg['ecc'], np.array(soft))
+    frame_err = 0 if corr[:len(data)] == data else 1
+
+    return err, frame_err
+
+def make_recording(cfg, rng, padlen=0.5):
+    # one frame over the simulated channel, for a ground-truth corpus
+    # (see nckcorpus.py). All randomness comes from rng, a recording is
+    # reproduced from the same seed. Returns (truth, audio) where truth
+    # holds the payload, bits and symbols as strings of digits, and the
+    # signal's position in audio as start and siglen (in samples)
+    M = cfg.get('M', 2)
+    nck = ncklib.NCK(FS=cfg['fs'], CF=cfg['cf'], BW=cfg['bw'],
+                     KR=cfg['kr'], M=M, USE_FFT=cfg['fft'], rng=rng,
+                     dtype=cfg.get('dtype', 'float64'))
+    length, _ = nckfec.frame_bits(cfg['ecc'], cfg['length'])
+    data = [ int(x) for x in rng.integers(0, 2, length) ]
+    bits = nckfec.encode(cfg['ecc'], data)
+    symlst, _ = bits_to_symbols(bits, M)
+
+    audio = nck.modulate(symlst)
+    audio /= np.max(np.abs(audio))
+    siglen = len(audio)
+    audio = nckchannel.pad(audio, nck.FS, padlen)
+    start = int(padlen * nck.FS)
+    if cfg.get('fading') or cfg.get('qsb') or cfg.get('sco_ppm') or \
+       cfg.get('foffset'):
+        ch = nckchannel.CHANNEL(FS=nck.FS, BW=nck.BW, fading=cfg.get('fading'),
+                                qsb=cfg.get('qsb'),
+                                sco_ppm=cfg.get('sco_ppm', 0),
+                                foffset=cfg.get('foffset', 0), rng=rng)
+        audio = ch.apply(audio)
+        start += ch.latency()
+    audio = nckchannel.awgn(audio, cfg['snr'], cfg['bw'], cfg['fs'],
+                            siglen=siglen, rng=rng)
+    audio /= np.max(np.abs(audio))
+
+    truth = {
+        'data'   : ''.join([str(b) for b in data]),
+        'bits'   : ''.join([str(b) for b in bits]),
+        'symbols': ''.join([str(s) for s in symlst]),
+        'start'  : start,
+        'siglen' : siglen,
+    }
+    return truth, audio
+
+# ---------------------------------------------------------------------------
+
+def simulate_point(store, cfg, rounds, checkpoint=100, max_ferrs=60,
+                   verbose=True):
+    # simulates one (kr,snr) point, resuming from the counts found in the
+    # store and appending a checkpoint every 'checkpoint' rounds. Stops
+    # after 'rounds' frames or 'max_ferrs' frame errors.
+    # Returns the point's totals (see RESULTSTORE.point())
+    kr, snr = cfg['kr'], cfg['snr']
+    p = store.point(kr, snr)
+    frames, bit_err_sum, frame_err_sum = p['frames'], p['bit_errs'], \
+                                         p['frame_errs']
+    if frames > 0 and not p['final'] and verbose:
+        print(f"resuming kr={kr} snr={snr} at round {frames}")
+
+    while not p['final'] and frames < rounds and frame_err_sum < max_ferrs:
+        seed = int.from_bytes(os.urandom(4), 'little')
+        np.random.seed(seed) # each chunk can be reproduced from its seed
+        cpu = time.process_time()
+        berrs, ferrs, cnt = 0, 0, 0
+        while cnt < checkpoint and frames + cnt < rounds and \
+              frame_err_sum + ferrs < max_ferrs:
+            berr, ferr = one_round(cfg)
+            berrs += berr
+            ferrs += ferr
+            cnt += 1
+        frames += cnt
+        bit_err_sum += berrs
+        frame_err_sum += ferrs
+        final = frames >= rounds or frame_err_sum >= max_ferrs
+        store.checkpoint(kr, snr, seed, cnt, berrs, ferrs,
+                         time.process_time() - cpu, final)
+        p = store.point(kr, snr)
+
+    if verbose:
+        print(f"kr={kr} snr={snr} rounds={p['frames']} fer={'%e' % p['fer']}")
+    return p
+
+# eof
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+# nckstore.py
+# append-only result store for the FER simulations (SQLite)
+
+# SW released under the MIT license
+
+# A store holds the simulation's configuration plus a log of "chunks":
+# each chunk records the counts gathered for one (kr,snr) point since the
+# previous checkpoint. Rows are only ever appended, the totals for a point
+# are the sum over its chunks. This makes it possible to resume an
+# interrupted point where it stopped, and lets several processes append
+# to the same store (SQLite serializes the writers).
+#
+# usage:
+#   % ./nckstore.py simu.sqlite               # list the points of a store
+#   % ./nckstore.py old-simu.json new.sqlite  # convert a legacy JSON file
+
+from datetime import datetime,UTC
+import json
+import os
+import sqlite3
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cfg (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    kr         REAL    NOT NULL,
+    snr        REAL    NOT NULL,
+    seed       INTEGER,
+    frames     INTEGER NOT NULL,
+    bit_errs   INTEGER NOT NULL,
+    frame_errs INTEGER NOT NULL,
+    cpu        REAL    NOT NULL,
+    final      INTEGER NOT NULL,
+    utc        TEXT
+);
+CREATE INDEX IF NOT EXISTS chunks_point ON chunks (kr, snr);
+'''
+
+def _utc():
+    return str(datetime.now(UTC))[:19]
+
+# ---------------------------------------------------------------------------
+
+class RESULTSTORE:
+
+    def __init__(self, fname, cfg=None, timeout=60):
+        # opens an existing store, or creates one with the given cfg dict
+        # fname can be ':memory:' for a non-persistent store
+        self.fname = fname
+        self.db = sqlite3.connect(fname, timeout=timeout)
+        if fname != ':memory:':
+            self.db.execute('PRAGMA journal_mode=WAL')
+        with self.db:
+            self.db.executescript(SCHEMA)
+        if cfg != None and len(self.cfg()) == 0:
+            with self.db:
+                self.db.executemany('INSERT OR IGNORE INTO cfg VALUES (?,?)',
+                            [ (k, json.dumps(v)) for k,v in cfg.items() ])
+
+    def close(self):
+        self.db.close()
+
+    def cfg(self):
+        # returns the configuration as a dict
+        rows = self.db.execute('SELECT key, value FROM cfg').fetchall()
+        return { k: json.loads(v) for k,v in rows }
+
+    def checkpoint(self, kr, snr, seed, frames, bit_errs, frame_errs, cpu,
+                   final=False):
+        # appends the counts gathered since the last checkpoint
+        with self.db:
+            self.db.execute('INSERT INTO chunks (kr, snr, seed, frames,'
+                            ' bit_errs, frame_errs, cpu, final, utc)'
+                            ' VALUES (?,?,?,?,?,?,?,?,?)',
+                            (float(kr), float(snr), seed, int(frames),
+                             int(bit_errs), int(frame_errs), float(cpu),
+                             1 if final else 0, _utc()))
+
+    def point(self, kr, snr):
+        # returns the accumulated counts of one (kr,snr) point
+        row = self.db.execute('SELECT COUNT(*), SUM(frames), SUM(bit_errs),'
+                              ' SUM(frame_errs), SUM(cpu), MAX(final)'
+                              ' FROM chunks WHERE kr=? AND snr=?',
+                              (float(kr), float(snr))).fetchone()
+        return self._totals(kr, snr, row[1:]) if row[0] > 0 else \
+               self._totals(kr, snr, (0, 0, 0, 0., 0))
+
+    def points(self):
+        # returns the accumulated counts of all points, sorted by kr and snr
+        rows = self.db.execute('SELECT kr, snr, SUM(frames), SUM(bit_errs),'
+                               ' SUM(frame_errs), SUM(cpu), MAX(final)'
+                               ' FROM chunks GROUP BY kr, snr'
+                               ' ORDER BY kr, snr').fetchall()
+        return [ self._totals(r[0], r[1], r[2:]) for r in rows ]
+
+    def last_update(self):
+        row = self.db.execute('SELECT MAX(utc) FROM chunks').fetchone()
+        return row[0] if row[0] != None else self.cfg().get('utc', '')
+
+    def _totals(self, kr, snr, row):
+        frames, bit_errs, frame_errs, cpu, final = row
+        return {
+            'kr'        : float(kr),
+            'snr'       : float(snr),
+            'frames'    : frames,
+            'bit_errs'  : bit_errs,
+            'frame_errs': frame_errs,
+            'cpu'       : cpu,
+            'final'     : bool(final),
+            'fer'       : frame_errs / frames if frames > 0 else 1.0
+        }
+
+    def import_json(self, fname):
+        # converts a legacy JSON file written by older versions of
+        # mk_nck-fer_simulation.py ("kr=20.0 snr=3.0 rounds=.. fer=..")
+        with open(fname, 'r') as f:
+            simu = json.load(f)
+        cfg = dict(simu['cfg'])
+        with self.db:
+            self.db.executemany('INSERT OR REPLACE INTO cfg VALUES (?,?)',
+                            [ (k, json.dumps(v)) for k,v in cfg.items() ])
+        for kr, pts in simu['data'].items():
+            for snr, line in pts.items():
+                vals = dict([ kv.split('=') for kv in line.split() ])
+                frames = int(vals['rounds'])
+                ferrs = int(round(float(vals['fer']) * frames))
+                self.checkpoint(kr, snr, None, frames, 0, ferrs, 0., True)
+
+    pass
+
+def open_store(fname):
+    # opens a store for reading, legacy JSON files are converted on the fly
+    if fname.endswith('.json'):
+        store = RESULTSTORE(':memory:')
+        store.import_json(fname)
+        return store
+    if not os.path.isfile(fname):
+        raise FileNotFoundError(fname)
+    return RESULTSTORE(fname)
+
+# ---------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) == 3:
+        store = RESULTSTORE(sys.argv[2])
+        store.import_json(sys.argv[1])
+        print(f"--> {sys.argv[2]}")
+    else:
+        store = open_store(sys.argv[1])
+        print(store.cfg())
+        for p in store.points():
+            print(f"kr={p['kr']} snr={p['snr']} frames={p['frames']}",
+                  f"berrs={p['bit_errs']} ferrs={p['frame_errs']}",
+                  f"fer={'%e' % p['fer']} cpu={'%.1f' % p['cpu']}s",
+                  "" if p['final'] else "(partial)")
+
+# eof
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+# ncktables.py
+# on-disk cache for precomputed tables and filter designs
+
+# SW released under the MIT license
+
+# A table is a dict of arrays that a function computes from a small
+# configuration (e.g. FS, CF, BW). load() computes it once and keeps
+# it as .npy files in the cache directory:
+#
+#   <cache>/v<VERSION>/<name>/<digest>/<field>.npy
+#
+# where the digest covers the configuration, the source of the module
+# that computes the table and of the modules it takes data from (deps):
+# a code change invalidates its tables.
+# The files are memory-mapped read-only, so the workers of a process
+# pool share their pages. Tables are also kept per process, a second
+# load() of the same table costs a dict lookup.
+#
+# The cache lives in $NCK_CACHE, else in $XDG_CACHE_HOME/nck or
+# ~/.cache/nck. NCK_CACHE='' disables it (tables are computed in each
+# process). Where the directory cannot be written, tables are computed.
+#
+# % ./ncktables.py          # builds the common tables, lists the cache
+# % ./ncktables.py -c       # clears the cache
+
+import hashlib
+import importlib.util
+import json
+import numpy as np
+import os
+import shutil
+import sys
+
+VERSION = 1
+
+def cache_dir():
+    d = os.environ.get('NCK_CACHE')
+    if d == None:
+        d = os.path.join(os.environ.get('XDG_CACHE_HOME',
+                                        os.path.expanduser('~/.cache')), 'nck')
+    return os.path.join(d, f"v{VERSION}") if d != '' else None
+
+_tables = {} # (name, digest) -> dict of arrays
+_sources = {} # module name -> hash of its source
+
+def _source_hash(module):
+    # found without importing it: data modules can stay lazy
+    if module not in _sources:
+        h = hashlib.sha256()
+        fn = getattr(sys.modules.get(module), '__file__', None)
+        if fn == None:
+            spec = importlib.util.find_spec(module)
+            fn = None if spec == None else spec.origin
+        if fn != None:
+            with open(fn, 'rb') as f:
+                h.update(f.read())
+        _sources[module] = h.hexdigest()
+    return _sources[module]
+
+def digest(name, key, make, deps=()):
+    j = json.dumps({ 'name': name, 'key': key,
+                     'code': [ _source_hash(m) for m in
+                               [make.__module__] + list(deps) ] },
+                   sort_keys=True)
+    return hashlib.sha256(j.encode()).hexdigest()[:24]
+
+def load(name, key, make, deps=()):
+    # returns make()'s dict of arrays for a JSON-able key. deps: names
+    # of further modules make() takes its data from, their source is
+    # part of the digest, too
+    d = digest(name, key, make, deps)
+    if (name, d) in _tables:
+        return _tables[(name, d)]
+    top = cache_dir()
+    t = None
+    if top != None:
+        path = os.path.join(top, name, d)
+        t = _read(path)
+        if t == None:
+            t = _write(path, make())
+    if t == None: # no cache, or not writable
+        t = { k: np.asarray(v) for k,v in make().items() }
+    _tables[(name, d)] = t
+    return t
+
+def _read(path):
+    try:
+        return { fn[:-4]: np.load(os.path.join(path, fn), mmap_mode='r')
+                 for fn in sorted(os.listdir(path)) if fn.endswith('.npy') }
+    except (OSError, ValueError):
+        return None
+
+def _write(path, t):
+    # writes into a private directory first, renamed when complete:
+    # concurrent creators are fine, the first rename wins
+    tmp = path + f'.{os.getpid()}.tmp'
+    try:
+        os.makedirs(tmp, exist_ok=True)
+        for k,v in t.items():
+            np.save(os.path.join(tmp, k + '.npy'), np.asarray(v))
+        try:
+            os.rename(tmp, path)
+        except OSError: # someone else was faster
+            shutil.rmtree(tmp, ignore_errors=True)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        return None
+    return _read(path)
+
+# ---------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-c', '--clear', action='store_true',
+                              help="remove all cached tables")
+    args = parser.parse_args(sys.argv[1:])
+
+    top = cache_dir()
+    if top == None:
+        sys.exit("cache disabled (NCK_CACHE='')")
+    if args.clear:
+        shutil.rmtree(os.path.dirname(top), ignore_errors=True)
+        print(f"removed {os.path.dirname(top)}")
+        sys.exit(0)
+
+    import ft8_coding
+    import ldpc96
+    import ncklib
+
+    t0 = time.perf_counter()
+    ft8_coding.FT8_CODING()
+    ldpc96._matrices()
+    for n in [96, 174]:
+        ncklib.INTERLEAVE(n)
+    for FS in [6000, 8000, 12000, 48000]:
+        for BW in [250, 500, 1000]:
+            ncklib.DOWNCONVERTER(FS, 1250 if FS > 6000 else 1000, BW)
+    print(f"tables built or loaded in {time.perf_counter() - t0:.2f} sec")
+
+    print(f"{top}:")
+    for name in sorted(os.listdir(top)):
+        ds = [ os.path.join(top, name, d)
+               for d in os.listdir(os.path.join(top, name))
+               if not d.endswith('.tmp') ]
+        size = sum([ os.path.getsize(os.path.join(d, fn))
+                     for d in ds for fn in os.listdir(d) ])
+        print(f"  {name:16s} {len(ds):4d} table(s) {size/1024:10.1f} KiB")
+
+# eof
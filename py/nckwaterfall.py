@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+
+# nckwaterfall.py
+# STFT waterfall for long recordings, computed in tiles and cached on
+# disk at several zoom levels
+
+# SW released under the MIT license
+
+# Level 0 holds one spectrum per STFT frame, level l the mean power of
+# 4**l frames. Each level also holds the min/max envelope of the
+# samples. The STFT is computed tile by tile (TILE frames), so memory
+# does not depend on the recording's length, and the levels are
+# memory-mapped .npy files in a cache directory: a render only reads
+# the rows of the level that suits the visible time range and width,
+# and reopening a recording shows it without any STFT work. An
+# interrupted build resumes with the first missing tile.
+#
+# Spectra are power spectral densities in dB, scaled like matplotlib's
+# specgram(), for the same vmin/vmax.
+
+import json
+import numpy as np
+import os
+import sys
+
+TILE    = 1024 # frames, a multiple of 4**LEVELS
+LEVELS  = 5    # zoom levels above level 0
+VERSION = 1
+
+# ---------------------------------------------------------------------------
+
+class WATERFALL:
+
+    def __init__(self, samples, fs, nfft=1024, hop=None, pad_to=None,
+                 cache=None, source=None, verbose=False):
+        # samples  1-D array, e.g. memory-mapped (nckio.open_audio())
+        # hop      frame advance, default is nfft/2
+        # cache    directory for the levels, None keeps them in memory
+        # source   file the samples come from, a changed file (size or
+        #          mtime) invalidates the cache
+        self.samples = samples
+        self.fs = fs
+        self.nfft = nfft
+        self.hop = nfft // 2 if hop == None else hop
+        self.pad_to = nfft if pad_to == None else pad_to
+        self.nbins = self.pad_to // 2 + 1
+        self.win = np.hanning(nfft) # as mlab.window_hanning
+        self.n = max(0, (len(samples) - nfft) // self.hop + 1) # frames
+        self.ntiles = (self.n + TILE - 1) // TILE
+        self.cache = cache
+        self.verbose = verbose
+
+        self.meta = {
+            'version': VERSION, 'fs': fs, 'nfft': nfft, 'hop': self.hop,
+            'pad_to': self.pad_to, 'samples': len(samples),
+        }
+        if source != None:
+            st = os.stat(source)
+            self.meta['source'] = [os.path.abspath(source), st.st_size,
+                                   st.st_mtime_ns]
+        self._open()
+        self.build()
+
+    def _rows(self, l):
+        return (self.n + 4**l - 1) // 4**l
+
+    def _open(self):
+        done, mode = 0, 'w+'
+        if self.cache != None:
+            os.makedirs(self.cache, exist_ok=True)
+            try:
+                with open(os.path.join(self.cache, 'meta.json')) as f:
+                    m = json.load(f)
+                done = m.pop('tiles')
+                if m == self.meta:
+                    mode = 'r+' if done < self.ntiles else 'r'
+                else:
+                    done = 0
+            except (OSError, ValueError, KeyError):
+                pass
+        self.done = done
+        self.spec, self.env = [], []
+        for l in range(LEVELS + 1):
+            shape = (self._rows(l), self.nbins)
+            if self.cache == None:
+                self.spec.append(np.zeros(shape, dtype=np.float16))
+                self.env.append(np.zeros((shape[0], 2), dtype=np.float32))
+                continue
+            for lst, name, shp, dt in [
+                    (self.spec, f"L{l}.npy", shape, np.float16),
+                    (self.env,  f"E{l}.npy", (shape[0], 2), np.float32)]:
+                fn = os.path.join(self.cache, name)
+                if mode == 'w+':
+                    lst.append(np.lib.format.open_memmap(fn, mode='w+',
+                                                         dtype=dt, shape=shp))
+                else:
+                    lst.append(np.load(fn, mmap_mode=mode))
+
+    def _save_meta(self):
+        if self.cache == None:
+            return
+        for a in self.spec + self.env:
+            a.flush()
+        fn = os.path.join(self.cache, 'meta.json')
+        with open(fn + '.tmp', 'w') as f:
+            json.dump(dict(self.meta, tiles=self.done), f)
+        os.replace(fn + '.tmp', fn)
+
+    def _tile(self, t):
+        # computes tile t: power spectra of its frames, then all levels
+        f0 = t * TILE
+        nf = min(TILE, self.n - f0)
+        a = f0 * self.hop
+        x = np.asarray(self.samples[a : a + (nf-1)*self.hop + self.nfft],
+                       dtype=float)
+        frames = np.lib.stride_tricks.sliding_window_view(x, self.nfft)
+        frames = frames[::self.hop][:nf]
+        p = np.abs(np.fft.rfft(frames * self.win, self.pad_to))**2
+        p /= self.fs * np.sum(self.win**2) # psd, as in mlab.specgram
+        p[:, 1:-1 if self.pad_to % 2 == 0 else None] *= 2 # one-sided
+        # envelope of each frame's hop (the last frame: all of it)
+        seg = np.lib.stride_tricks.sliding_window_view(
+                  np.concatenate((x, np.full(self.hop, x[-1]))),
+                  self.hop)[::self.hop][:nf]
+        e = np.stack((np.min(seg, axis=1), np.max(seg, axis=1)), axis=1)
+        for l in range(LEVELS + 1):
+            k = 4**l
+            r0, nr = f0 // k, (nf + k - 1) // k
+            pad = nr * k - nf
+            pl = np.concatenate((p, np.full((pad, self.nbins), np.nan)))
+            el = np.concatenate((e, np.repeat(e[-1:], pad, axis=0)))
+            pl = np.nanmean(pl.reshape(nr, k, self.nbins), axis=1)
+            self.spec[l][r0:r0+nr] = 10 * np.log10(pl + 1e-20)
+            self.env[l][r0:r0+nr, 0] = np.min(el[:,0].reshape(nr, k), axis=1)
+            self.env[l][r0:r0+nr, 1] = np.max(el[:,1].reshape(nr, k), axis=1)
+
+    def build(self):
+        # computes the missing tiles
+        while self.done < self.ntiles:
+            self._tile(self.done)
+            self.done += 1
+            if self.cache != None and \
+               (self.done % 16 == 0 or self.done == self.ntiles):
+                self._save_meta()
+            if self.verbose:
+                print(f"\rwaterfall: {self.done}/{self.ntiles} tiles",
+                      end='', file=sys.stderr, flush=True)
+        if self.verbose and self.ntiles > 0:
+            print(file=sys.stderr)
+
+    def level(self, t0, t1, width):
+        # coarsest level with at least 'width' rows between t0 and t1
+        frames = (t1 - t0) * self.fs / self.hop
+        l = 0
+        while l < LEVELS and frames / 4**(l+1) >= width:
+            l += 1
+        return l
+
+    def view(self, t0=0, t1=None, width=1000):
+        # returns (spec, env, extent) for the time range t0..t1 (sec),
+        # with at least 'width' columns where the level 0 has them:
+        #   spec    dB, shape (bins, columns), for imshow(origin='lower')
+        #   env     min/max of the samples per column, shape (columns, 2)
+        #   extent  (t0, t1, 0, fs/2) of the returned columns
+        t1 = self.n * self.hop / self.fs if t1 == None else t1
+        l = self.level(t0, t1, width)
+        dt = 4**l * self.hop / self.fs # sec per row
+        r0 = min(max(0, int(t0 / dt)), self._rows(l) - 1)
+        r1 = max(min(self._rows(l), int(np.ceil(t1 / dt))), r0 + 1)
+        spec = np.asarray(self.spec[l][r0:r1], dtype=np.float32).T
+        env = np.asarray(self.env[l][r0:r1])
+        # frame i is centered at (i*hop + nfft/2)/fs
+        c = self.nfft / 2 / self.fs
+        return spec, env, (r0 * dt + c, r1 * dt + c, 0, self.fs / 2)
+
+    def mean_spectrum(self):
+        # mean power per bin over the whole recording, and the bins' freqs
+        p = 10**(np.asarray(self.spec[LEVELS], dtype=float) / 10)
+        w = np.minimum(4**LEVELS, self.n - 4**LEVELS *
+                                  np.arange(self._rows(LEVELS)))
+        return np.sum(p * w[:,None], axis=0) / max(1, self.n), \
+               np.arange(self.nbins) * self.fs / self.pad_to
+
+    pass
+
+# eof
@@ -2,43 +2,52 @@
 
 # https://web.archive.org/web/20161203074728/http://jaganadhg.freeflux.net:80/blog/archive/2009/09/09/plotting-wave-form-and-spectrogram-the-pure-python-way.html
 
+# The waterfall comes from nckwaterfall, cached in '<file>.wf/': long
+# recordings open without recomputing the STFT, and zooming in only
+# reads the visible part at a matching resolution.
+
+import argparse
+import nckio
+from nckwaterfall import WATERFALL
 import sys
 from pylab import *
-from matplotlib import transforms
-import wave
 
-def show_wave_n_spec(fn):
-    spf = wave.open(fn, 'rb')
-    fs = spf.getframerate()
-    sound_info = frombuffer(spf.readframes(-1), int16)
-    spf.close()
+WIDTH = 2000 # columns to render, about the figure's width in pixels
+
+def show_wave_n_spec(fn, cache):
+    fs, sound_info = nckio.open_audio(fn)
+    wf = WATERFALL(sound_info, fs, nfft=1024, hop=1024-20, cache=cache,
+                   source=fn, verbose=True)
 
     fig = plt.figure(figsize=(10, 8))
     row1, row2 = fig.subfigures(2, 1, height_ratios=[1, 1])
     # row1.title('Wave from and spectrogram of %s' % fn)
 
     ax = row1.subplots(1, 1)
-    ax.plot(sound_info)
+    _, env, ext = wf.view(width=WIDTH)
+    x = np.linspace(ext[0], ext[1], len(env)) * fs
+    ax.fill_between(x, env[:,0], env[:,1], linewidth=0.5)
     ax.set_xlabel("t (samples)")
     ax.set_ylabel("amplitude (wav file)")
 
     plots = row2.subplots(1, 2, width_ratios=[6,1])
     row2.subplots_adjust(wspace=0.05)
     ax = plots[0]
-    spectrogram = ax.specgram(sound_info,
-                              sides = 'default',
-                              Fs = fs,
-                              NFFT = 1024, # 64
-                              pad_to = 8192, # 4096,
-                              noverlap = 20,
-                              window = window_hanning,
-                              vmin=13,vmax=50) # vmin=0.001)
+    spec, _, ext = wf.view(width=WIDTH)
+    img = ax.imshow(spec, origin='lower', aspect='auto', extent=ext,
+                    interpolation='nearest', vmin=13, vmax=50)
+    ax.set_xlim(ext[:2])
     ax.set_ylim( [0,3000] )
     ax.set_xlabel("t (sec)")
     ax.set_ylabel("frequency (Hz)")
 
-    sp, fr, t, img = spectrogram
-    s = np.sum(sp, axis=1)
+    def zoomed(ax): # re-render the visible part
+        spec, _, ext = wf.view(*ax.get_xlim(), width=WIDTH)
+        img.set_data(spec)
+        img.set_extent(ext)
+    ax.callbacks.connect('xlim_changed', zoomed)
+
+    s, fr = wf.mean_spectrum()
     s /= np.max(s)/120
     # s = (s * 120).astype(int)
 
@@ -50,6 +59,16 @@ def show_wave_n_spec(fn):
 
     show()
 
-show_wave_n_spec('out.wav' if len(sys.argv) == 1 else sys.argv[1])
+parser = argparse.ArgumentParser()
+parser.add_argument('file', type=str, nargs='?', default='out.wav',
+                          help="WAV file. Default=out.wav")
+parser.add_argument('-c', '--cache', type=str, default=None,
+                          help="cache directory. Default=<file>.wf")
+parser.add_argument('-n', '--nocache', action='store_true',
+                          help="do not cache the waterfall")
+args = parser.parse_args(sys.argv[1:])
+
+show_wave_n_spec(args.file, None if args.nocache else \
+                            args.cache or args.file + '.wf')
 
 # eof